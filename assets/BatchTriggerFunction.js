@@ -4,6 +4,8 @@ const OutputBucketName = process.env.OUTPUT_BUCKET_NAME;
 const VideoBucketURL = process.env.VIDEO_BUCKET_NAME;
 const JobDefinitionName = process.env.JOB_DEFINITION_NAME;
 const JobQueueName = process.env.JOB_QUEUE_NAME
+const Languages = process.env.OUTLANG.split(/\s+/).filter(Boolean);
+const SharedURI = process.env.SHARED_URI;
 
 exports.lambdaHandler = async (event, context) => {
 
@@ -27,33 +29,66 @@ exports.lambdaHandler = async (event, context) => {
 
     const batch = new AWS.Batch();
 
+    const environment = [
+        {
+            name: 'INVIDEO',
+            value: videoURI,
+        },
+        {
+
+            name: "INSUBTITLES",
+            value: subtitlesURI,
+        },
+        {
+
+            name: "OUTBUCKET",
+            value: OutputBucketName,
+        },
+        {
+            name: "OUTLANG",
+            value: Languages.join(" "),
+        },
+        {
+            name: "SHARED_URI",
+            value: SharedURI,
+        },
+    ];
+
     const params = {
         jobName: "jobName",
         jobQueue: JobQueueName,
         jobDefinition: JobDefinitionName,
         containerOverrides: {
-            environment: [
-                {
-                    name: 'INVIDEO',
-                    value: videoURI,
-                },
-                {
-
-                    name: "INSUBTITLES",
-                    value: subtitlesURI,
-                },
-                {
-
-                    name: "OUTBUCKET",
-                    value: OutputBucketName,
-                },
-            ],
+            environment: environment,
         },
     };
 
     try {
-        const response = await batch.submitJob(params).promise();
-        console.log('Job submitted successfully:', response);
+        // Batch arrays have at least 2 children, a single language runs as one job
+        if (Languages.length < 2) {
+            const response = await batch.submitJob(params).promise();
+            console.log('Job submitted successfully:', response);
+            return response;
+        }
+
+        // The prepare job publishes the parsed transcript and the English
+        // subtitles, then one array child per language renders that language
+        const prepare = await batch.submitJob({
+            ...params,
+            jobName: "prepare",
+            containerOverrides: {
+                environment: environment.concat([{ name: "JOB_STAGE", value: "prepare" }]),
+            },
+        }).promise();
+        console.log('Prepare job submitted successfully:', prepare);
+
+        const response = await batch.submitJob({
+            ...params,
+            jobName: "languages",
+            arrayProperties: { size: Languages.length },
+            dependsOn: [{ jobId: prepare.jobId }],
+        }).promise();
+        console.log('Array job submitted successfully:', response);
         return response;
     } catch (error) {
         console.error('Error submitting job:', error);
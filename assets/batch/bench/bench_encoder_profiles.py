@@ -0,0 +1,85 @@
+"""
+Render a fixed synthetic clip under every encoder profile and report the
+encoding speed, wall time and output size of each
+
+Usage: python3 bench_encoder_profiles.py [seconds] [width] [height]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+from moviepy.editor import AudioClip, VideoClip  # noqa: E402
+
+from encoding import ENCODER_PROFILES, get_encoder_profile, write_videofile_params  # noqa: E402
+
+FPS = 25
+
+
+def synthetic_clip(seconds, width, height):
+    """
+    A moving gradient with noise and a sine tone: cheap to generate but not
+    trivially compressible, so the encoder has real work to do
+    """
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 32, size=(height, width, 3), dtype=np.uint8)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+
+    def make_frame(t):
+        shift = t * 40
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:, :, 0] = (x + shift) % 256
+        frame[:, :, 1] = (y + shift) % 256
+        frame[:, :, 2] = (x[None, :] + y + 2 * shift) % 256 / 2
+        return frame + np.roll(noise, int(shift), axis=1)
+
+    def make_sound(t):
+        return 0.2 * np.sin(2 * np.pi * 440 * np.asarray(t)).reshape(-1, 1).repeat(2, axis=1)
+
+    clip = VideoClip(make_frame, duration=seconds).set_fps(FPS)
+    return clip.set_audio(AudioClip(make_sound, duration=seconds, fps=44100))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 1280
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 720
+
+    clip = synthetic_clip(seconds, width, height)
+    frames = int(seconds * FPS)
+    report = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ENCODER_PROFILES:
+            profile = get_encoder_profile(name)
+            output_file_name = os.path.join(directory, name + ".mp4")
+
+            started = time.perf_counter()
+            clip.write_videofile(output_file_name, logger=None,
+                                 temp_audiofile=os.path.join(directory, name + "-audio.mp4"),
+                                 **write_videofile_params(profile))
+            wall = time.perf_counter() - started
+
+            report.append({'profile': name, 'preset': profile['preset'],
+                           'crf': profile['crf'], 'threads': profile['threads'],
+                           'wall_seconds': round(wall, 3),
+                           'fps': round(frames / wall, 1),
+                           'size_bytes': os.path.getsize(output_file_name)})
+
+    print("%-10s %-10s %4s %8s %8s %12s" %
+          ("profile", "preset", "crf", "wall s", "fps", "size KB"))
+    for row in report:
+        print("%-10s %-10s %4d %8.2f %8.1f %12.1f" %
+              (row['profile'], row['preset'], row['crf'], row['wall_seconds'],
+               row['fps'], row['size_bytes'] / 1024))
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
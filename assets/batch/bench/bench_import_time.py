@@ -0,0 +1,65 @@
+"""
+Cold-start import time of the batch entry points, measured with
+python -X importtime in fresh interpreters. Exits with status 1 when an
+entry point takes longer than the budget to import, or when it loads one of
+the modules that only the render stages should load.
+
+Usage: python3 bench_import_time.py [budget_ms] [repeat]
+"""
+import os
+import subprocess
+import sys
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code')
+
+ENTRY_POINTS = ('locate', 'worker')
+
+# Loaded on first use by the render stages, never at import
+DEFERRED = ('moviepy', 'imageio', 'IPython')
+
+
+def import_times(module):
+    """
+    Import module in a fresh interpreter
+
+    :return: dict of module name to (self, cumulative) import time in microseconds
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            cwd=CODE_DIR, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    failed = False
+    print("%-10s %10s %10s" % ("module", "best ms", "budget ms"))
+    for module in ENTRY_POINTS:
+        runs = [import_times(module) for _ in range(repeat)]
+        best = min(runs, key=lambda times: times[module][1])
+        best_ms = best[module][1] / 1000
+        print("%-10s %10.1f %10.1f" % (module, best_ms, budget_ms))
+
+        deferred = sorted(name for name in best if name.split('.')[0] in DEFERRED)
+        if deferred:
+            print("  loads %s at import" % ", ".join(deferred[:5]))
+            failed = True
+        if best_ms > budget_ms:
+            slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:10]
+            for name, (self_us, _) in slowest:
+                print("  %8.1f ms  %s" % (self_us / 1000, name))
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
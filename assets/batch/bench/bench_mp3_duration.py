@@ -0,0 +1,65 @@
+"""
+Benchmark the header-only MP3 duration probe against AudioFileClip(...).duration
+on audio encoded like the Amazon Polly output (MPEG-2 Layer III, 22050 Hz, mono)
+
+Usage: python3 bench_mp3_duration.py [seconds] [repeat]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+from moviepy.config import get_setting  # noqa: E402
+from moviepy.editor import AudioFileClip  # noqa: E402
+
+from mp3info import mp3_duration  # noqa: E402
+
+
+def make_polly_like_mp3(file_name, seconds):
+    """
+    Encode a sine wave the way Polly returns speech: 22050 Hz mono MP3
+    """
+    subprocess.run([get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-y",
+                    "-f", "lavfi", "-i", "sine=frequency=220:duration=%s" % seconds,
+                    "-ar", "22050", "-ac", "1", "-b:a", "48k", file_name], check=True)
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "polly.mp3")
+        make_polly_like_mp3(file_name, seconds)
+        with open(file_name, "rb") as file:
+            data = file.read()
+
+        def probe():
+            return mp3_duration(data)
+
+        def moviepy():
+            clip = AudioFileClip(file_name)
+            clip.close()
+            return clip.duration
+
+        probe_duration, probe_time = timed(probe, repeat)
+        moviepy_duration, moviepy_time = timed(moviepy, repeat)
+
+    print("%-22s %10s %12s" % ("method", "duration", "ms per call"))
+    print("%-22s %10.3f %12.3f" % ("mp3_duration", probe_duration, probe_time * 1000))
+    print("%-22s %10.3f %12.3f" % ("AudioFileClip", moviepy_duration, moviepy_time * 1000))
+    print("speedup: %.1fx" % (moviepy_time / probe_time))
+
+
+if __name__ == "__main__":
+    main()
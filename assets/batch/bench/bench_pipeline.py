@@ -0,0 +1,172 @@
+"""
+Offline end-to-end benchmark of locate.py: generate a synthetic video and a
+Transcribe-format transcript of matching length, run every stage of one
+language against the local stand-ins of fake_aws, and report the wall and
+CPU time of each stage as JSON to compare between releases.
+
+Without ImageMagick run it with RENDER_BACKEND=ffmpeg.
+Leave TRANSLATION_CACHE unset: the translation stage runs after synthesis
+with the in-memory cache cleared, a persistent one would serve it.
+
+Usage: python3 bench_pipeline.py [seconds,seconds,...] [report.json]
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+from moviepy.config import get_setting  # noqa: E402
+
+import fake_aws  # noqa: E402
+import locate  # noqa: E402
+from metrics import cpu_seconds  # noqa: E402
+from transcript import Transcript  # noqa: E402
+from transfer import download_file_from_s3, upload_file_to_s3  # noqa: E402
+from translation_cache import TRANSLATION_CACHE  # noqa: E402
+
+REGION = 'us-east-1'
+LANG = 'es'
+
+# Transcribe timing of the synthetic speaker
+WORD_SECONDS = 0.3
+GAP_SECONDS = 0.1
+SENTENCE_WORDS = 12
+
+VOCABULARY = ("the quick brown fox jumps over a lazy dog while seven wizards "
+              "quietly judge boxing matches near old harbors").split()
+
+
+def make_video(file_name, seconds):
+    """
+    Write a 640x360 test pattern with a sine tone
+    """
+    subprocess.run([get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+                    "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=25:duration=%s" % seconds,
+                    "-f", "lavfi", "-i", "sine=frequency=220:duration=%s" % seconds,
+                    "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac",
+                    "-shortest", file_name], check=True)
+
+
+def make_transcript(file_name, seconds):
+    """
+    Write a Transcribe-format JSON transcript speaking words for the whole
+    duration, with a full stop every SENTENCE_WORDS words
+
+    :return: the number of words
+    """
+    items = []
+    words = []
+    t = 0.0
+    n = 0
+    while t + WORD_SECONDS <= seconds:
+        word = VOCABULARY[n % len(VOCABULARY)]
+        items.append({'start_time': "%.3f" % t, 'end_time': "%.3f" % (t + WORD_SECONDS),
+                      'alternatives': [{'confidence': '1.0', 'content': word}],
+                      'type': 'pronunciation'})
+        words.append(word)
+        n += 1
+        if n % SENTENCE_WORDS == 0:
+            items.append({'alternatives': [{'confidence': '0.0', 'content': '.'}],
+                          'type': 'punctuation'})
+            words[-1] += '.'
+        t += WORD_SECONDS + GAP_SECONDS
+
+    document = {'jobName': 'bench', 'status': 'COMPLETED',
+                'results': {'transcripts': [{'transcript': " ".join(words)}],
+                            'items': items}}
+    with open(file_name, "w") as file:
+        json.dump(document, file)
+    return n
+
+
+def timed(stages, name, function, *args):
+    """
+    Run function(*args) and record its wall and CPU time under name
+    """
+    wall = time.perf_counter()
+    cpu = cpu_seconds()
+    result = function(*args)
+    stages[name] = {'wall_seconds': round(time.perf_counter() - wall, 3),
+                    'cpu_seconds': round(cpu_seconds() - cpu, 3)}
+    return result
+
+
+def run_size(root, seconds):
+    """
+    Run every stage for a video of the given length in a fresh directory
+    """
+    bucket = os.path.join(root, "input")
+    os.makedirs(bucket, exist_ok=True)
+    make_video(os.path.join(bucket, "talk.mp4"), seconds)
+    words = make_transcript(os.path.join(bucket, "talk.json"), seconds)
+
+    work = os.path.join(root, "work-%d" % seconds)
+    os.makedirs(work)
+    os.chdir(work)
+    fake_aws.CALLS.clear()
+
+    stages = {}
+    timed(stages, 'download', download_file_from_s3, "s3://input/talk.mp4", "video.mp4")
+    download_file_from_s3("s3://input/talk.json", "transcribe.json")
+    transcript = timed(stages, 'load_transcript', Transcript.load, "transcribe.json")
+    timed(stages, 'write_transcript_to_srt', locate.write_transcript_to_srt,
+          transcript, "subtitles-en.srt")
+    chunk_durations = timed(stages, 'synthesis', locate.create_audio_track_from_translation,
+                            transcript, 'en', LANG, locate.audio_track_name(LANG), REGION)
+    # synthesis translated the same text, time the translation without its cache hits
+    TRANSLATION_CACHE.clear()
+    timed(stages, 'translation', locate.write_translation_to_srt,
+          transcript, 'en', LANG, "subtitles-" + LANG + ".srt", REGION, chunk_durations)
+    timed(stages, 'create_video', locate.create_video, "video.mp4",
+          "subtitles-" + LANG + ".srt", "video-" + LANG + ".mp4",
+          locate.audio_track_name(LANG), False)
+    timed(stages, 'upload', upload_file_to_s3, "video-" + LANG + ".mp4", "output",
+          "talk-" + LANG + ".mp4")
+
+    return {'video_seconds': seconds, 'words': words,
+            'total_wall_seconds': round(sum(s['wall_seconds'] for s in stages.values()), 3),
+            'stages': stages, 'api_calls': dict(fake_aws.CALLS)}
+
+
+def main():
+    sizes = [float(size) for size in
+             (sys.argv[1] if len(sys.argv) > 1 else "30,120,600").split(",")]
+    report_file_name = sys.argv[2] if len(sys.argv) > 2 else None
+
+    logging.getLogger().setLevel(logging.WARNING)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        fake_aws.install(root)
+        try:
+            results = [run_size(root, seconds) for seconds in sizes]
+        finally:
+            os.chdir(cwd)
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(),
+              'cpus': os.cpu_count(),
+              'render_backend': os.getenv('RENDER_BACKEND', 'moviepy'),
+              'audio_format': os.getenv('AUDIO_FORMAT', 'mp3'),
+              'encoder_profile': os.getenv('ENCODER_PROFILE', 'balanced'),
+              'results': results}
+
+    print("%-10s %-26s %10s %10s" % ("seconds", "stage", "wall s", "cpu s"))
+    for result in results:
+        for name, stage in result['stages'].items():
+            print("%-10g %-26s %10.3f %10.3f" % (result['video_seconds'], name,
+                                                  stage['wall_seconds'], stage['cpu_seconds']))
+
+    if report_file_name:
+        with open(report_file_name, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Segment a synthetic transcript into subtitle phrases and write the SRT,
+with the array-based segmenter and with the previous per-item loop
+
+Usage: python3 bench_srt.py [items] [repeat]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+from segmenter import segment_transcript  # noqa: E402
+from srt import write_srt_file  # noqa: E402
+from transcript import PRONUNCIATION, PUNCTUATION, Transcript  # noqa: E402
+
+WORDS = "the quick brown fox jumps over a lazy dog while wizards judge".split()
+
+
+def synthetic_transcript(items):
+    """
+    Words of 0.3 seconds, a pause every 7 words and a full stop every 12
+    """
+    start_times, end_times, types = array('d'), array('d'), array('B')
+    contents, offsets = [], array('L', [0])
+    t = 0.0
+    words = 0
+    while len(types) < items:
+        if words and words % 12 == 0 and types[-1] == PRONUNCIATION:
+            content = "."
+            types.append(PUNCTUATION)
+            start_times.append(float('nan'))
+            end_times.append(float('nan'))
+        else:
+            content = WORDS[words % len(WORDS)]
+            types.append(PRONUNCIATION)
+            start_times.append(t)
+            end_times.append(t + 0.3)
+            t += 0.35 if words % 7 else 1.2
+            words += 1
+        contents.append(content)
+        offsets.append(offsets[-1] + len(content))
+    return Transcript(" ".join(contents), start_times, end_times, types,
+                      "".join(contents), offsets)
+
+
+def legacy_time_code(seconds):
+    t_hund = int(seconds % 1 * 1000)
+    t_seconds = int(seconds)
+    t_secs = ((float(t_seconds) / 60) % 1) * 60
+    t_mins = int(t_seconds / 60)
+    return f"00:{t_mins:02d}:{int(t_secs):02d},{t_hund:03d}"
+
+
+def legacy_srt(transcript, file_name):
+    """
+    The previous implementation: a 10-item counter, one regex per word and
+    one write per line
+    """
+    phrases = []
+    phrase = {'start_time': '', 'end_time': '', 'words': []}
+    new = True
+    for i in range(len(transcript)):
+        word = transcript.types[i] == PRONUNCIATION
+        if new:
+            if word:
+                phrase['start_time'] = legacy_time_code(transcript.start_times[i])
+                new = False
+        elif word:
+            phrase['end_time'] = legacy_time_code(transcript.end_times[i])
+        phrase['words'].append(transcript.content(i))
+        if len(phrase['words']) == 10:
+            phrases.append(phrase)
+            phrase = {'start_time': '', 'end_time': '', 'words': []}
+            new = True
+
+    with open(file_name, "w", encoding="utf-8") as file:
+        for n, phrase in enumerate(phrases, 1):
+            file.write(str(n) + "\n")
+            file.write(phrase['start_time'] + " --> " + phrase['end_time'] + "\n")
+            out = ""
+            for i, word in enumerate(phrase['words']):
+                if re.match('[a-zA-Z0-9]', word) and i > 0:
+                    out += " " + word
+                else:
+                    out += word
+            file.write(out + "\n\n")
+
+
+def best_of(repeat, function):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    transcript = synthetic_transcript(items)
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "subtitles.srt")
+
+        def run(**limits):
+            return lambda: write_srt_file(*segment_transcript(transcript, **limits), file_name)
+
+        cases = [
+            ("legacy loop", lambda: legacy_srt(transcript, file_name)),
+            ("max_words=10", run(max_words=10)),
+            ("max_words=10 max_gap=1", run(max_words=10, max_gap=1.0)),
+            ("max_words=14 max_duration=4", run(max_words=14, max_duration=4.0)),
+            ("segment only", lambda: segment_transcript(transcript)),
+        ]
+
+        print("%d items, best of %d" % (items, repeat))
+        print("%-30s %12s %14s" % ("case", "ms", "items/s"))
+        for name, function in cases:
+            seconds = best_of(repeat, function)
+            print("%-30s %12.2f %14.0f" % (name, seconds * 1000, items / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Check that the warm worker stops a job over its time budget while the
+languages render in a process pool (PARALLEL_LANGS > 1): the job has to be
+interrupted close to the budget, and the language processes and the
+programs they started must be gone. Runs against the local stand-ins of
+fake_aws, with every language replaced by a long sleep.
+
+Exits with status 1 when the job overruns or leaves a process behind.
+
+Usage: python3 check_worker_budget.py [budget_seconds]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+import bench_pipeline  # noqa: E402
+import fake_aws  # noqa: E402
+import locate  # noqa: E402
+import worker  # noqa: E402
+
+# Seconds a language would take without the budget
+LANGUAGE_SECONDS = 600
+
+# Seconds the job may take beyond its budget to stop
+GRACE_SECONDS = 5
+
+
+def slow_language(transcript, lang, region, checkpoints):
+    """
+    Stand-in for locate.process_language that runs a long program, like an
+    ffmpeg render, and records the pids of the language process and of the program
+    """
+    program = subprocess.Popen(["sleep", str(LANGUAGE_SECONDS)])
+    with open(os.path.join(PIDS_DIR, lang), "w") as file:
+        file.write("%d %d" % (os.getpid(), program.pid))
+    program.wait()
+    return "video-%s.mp4" % lang
+
+
+def alive(pid):
+    """
+    Return True if the process exists and is not a zombie
+    """
+    try:
+        with open('/proc/%d/stat' % pid) as file:
+            return file.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+def main():
+    global PIDS_DIR
+    budget_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory(prefix="budget-") as root:
+        fake_aws.install(root)
+        os.makedirs(os.path.join(root, 'input'))
+        bench_pipeline.make_video(os.path.join(root, 'input', 'talk.mp4'), 2)
+        bench_pipeline.make_transcript(os.path.join(root, 'input', 'talk.json'), 2)
+        PIDS_DIR = os.path.join(root, 'pids')
+        os.makedirs(PIDS_DIR)
+        locate.process_language = slow_language
+
+        descriptor = {'INVIDEO': 's3://input/talk.mp4', 'INSUBTITLES': 's3://input/talk.json',
+                      'OUTBUCKET': 'output', 'OUTLANG': 'es de', 'REGION': 'us-east-1',
+                      'PARALLEL_LANGS': '2', 'RENDER_BACKEND': 'ffmpeg'}
+        cwd = os.getcwd()
+        os.chdir(root)
+        started = time.monotonic()
+        try:
+            worker.run_descriptor(descriptor, worker.Budget(budget_seconds))
+            stopped = False
+        except worker.JobOverBudget:
+            stopped = True
+        finally:
+            os.chdir(cwd)
+        elapsed = time.monotonic() - started
+
+        pids = []
+        for name in os.listdir(PIDS_DIR):
+            with open(os.path.join(PIDS_DIR, name)) as file:
+                pids.extend(int(pid) for pid in file.read().split())
+        # the killed processes may take a moment to exit
+        deadline = time.monotonic() + GRACE_SECONDS
+        while any(alive(pid) for pid in pids) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        left = [pid for pid in pids if alive(pid)]
+
+    print("budget %g s, stopped %s after %.1f s, %d language processes started, %d left"
+          % (budget_seconds, stopped, elapsed, len(pids), len(left)))
+    failed = not stopped or elapsed > budget_seconds + GRACE_SECONDS or not pids or left
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Local stand-ins for the S3, Translate and Polly clients, so the batch code
+can be measured without AWS. install() makes aws_clients.get_client return
+them.
+"""
+import io
+import json
+import math
+import os
+import shutil
+import sys
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+import aws_clients  # noqa: E402
+
+# Silent MPEG-2 Layer III frame: 22050 Hz mono at 32 kbps, 576 samples in 104 bytes
+SILENT_FRAME = b'\xff\xf3\x40\xc4' + bytes(100)
+FRAME_SECONDS = 576 / 22050
+
+# Speaking rate of the fake voices
+SECONDS_PER_WORD = 0.35
+
+CALLS = Counter()
+
+
+class _Events:
+    def register(self, event_name, handler):
+        pass
+
+
+class _Meta:
+    events = _Events()
+
+
+class FakeS3:
+    """
+    S3 client storing the objects as files below root/<bucket>/<key>
+    """
+    meta = _Meta()
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def _missing(self, operation):
+        return ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+
+    def download_file(self, bucket, key, file_name, Config=None):
+        CALLS['s3.download_file'] += 1
+        if not os.path.exists(self._path(bucket, key)):
+            raise self._missing('HeadObject')
+        shutil.copyfile(self._path(bucket, key), file_name)
+
+    def upload_file(self, file_name, bucket, key, Config=None):
+        CALLS['s3.upload_file'] += 1
+        os.makedirs(os.path.dirname(self._path(bucket, key)), exist_ok=True)
+        shutil.copyfile(file_name, self._path(bucket, key))
+
+    def head_object(self, Bucket, Key):
+        CALLS['s3.head_object'] += 1
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise self._missing('HeadObject')
+        stat = os.stat(path)
+        return {'ETag': '"%x-%x"' % (stat.st_size, int(stat.st_mtime)),
+                'ContentLength': stat.st_size}
+
+    def get_object(self, Bucket, Key):
+        CALLS['s3.get_object'] += 1
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not Found'}},
+                              'GetObject')
+        with open(path, 'rb') as file:
+            return {'Body': io.BytesIO(file.read())}
+
+    def put_object(self, Bucket, Key, Body):
+        CALLS['s3.put_object'] += 1
+        os.makedirs(os.path.dirname(self._path(Bucket, Key)), exist_ok=True)
+        with open(self._path(Bucket, Key), 'wb') as file:
+            file.write(Body)
+
+    def delete_object(self, Bucket, Key):
+        CALLS['s3.delete_object'] += 1
+        if os.path.exists(self._path(Bucket, Key)):
+            os.remove(self._path(Bucket, Key))
+
+
+class FakeTranslate:
+    """
+    Translate client that returns the text unchanged
+    """
+    meta = _Meta()
+
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode):
+        CALLS['translate.translate_text'] += 1
+        return {'TranslatedText': Text, 'SourceLanguageCode': SourceLanguageCode,
+                'TargetLanguageCode': TargetLanguageCode}
+
+
+class FakePolly:
+    """
+    Polly client speaking every word in SECONDS_PER_WORD: silent MP3 or PCM
+    of that length, or the matching word speech marks
+    """
+    meta = _Meta()
+
+    def synthesize_speech(self, OutputFormat, Text, VoiceId, SampleRate=None,
+                          SpeechMarkTypes=None):
+        CALLS['polly.synthesize_speech'] += 1
+        words = Text.split()
+
+        if OutputFormat == 'json':
+            marks = []
+            offset = 0
+            for n, word in enumerate(words):
+                start = Text.index(word, offset)
+                offset = start + len(word)
+                marks.append(json.dumps({
+                    'time': int(n * SECONDS_PER_WORD * 1000), 'type': 'word',
+                    'start': len(Text[:start].encode('utf-8')),
+                    'end': len(Text[:offset].encode('utf-8')), 'value': word}))
+            body = "\n".join(marks).encode('utf-8')
+        elif OutputFormat == 'pcm':
+            samples = int(len(words) * SECONDS_PER_WORD * int(SampleRate))
+            body = bytes(2 * samples)
+        else:
+            frames = math.ceil(len(words) * SECONDS_PER_WORD / FRAME_SECONDS)
+            body = SILENT_FRAME * max(frames, 1)
+
+        return {'AudioStream': io.BytesIO(body),
+                'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+def install(root):
+    """
+    Route every aws_clients.get_client call to the local stand-ins
+
+    :param root: the directory holding the fake S3 buckets
+    """
+    clients = {'s3': FakeS3(root), 'translate': FakeTranslate(), 'polly': FakePolly()}
+    aws_clients.boto3.client = lambda service, **kwargs: clients[service]
+    aws_clients._clients.clear()
+    return clients
@@ -0,0 +1,98 @@
+"""
+Parity check between the MoviePy and the ffmpeg render backends of
+create_video: render the same synthetic clip and SRT through
+locate.create_video with either backend, then compare
+sampled frames. The subtitle boxes must land in the same place and the
+frames must stay close overall. Exits non-zero when they do not.
+
+Needs ImageMagick for the MoviePy backend, like the batch container.
+
+Usage: python3 parity_render_backends.py
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+from moviepy.editor import ColorClip, VideoFileClip  # noqa: E402
+
+import locate  # noqa: E402
+
+SRT = """1
+00:00:00,500 --> 00:00:02,000
+Hello world, this is a subtitle
+
+2
+00:00:02,500 --> 00:00:04,000
+A second, longer line of subtitle text
+
+"""
+
+# (time, subtitle shown) samples
+SAMPLES = [(0.2, False), (1.0, True), (2.2, False), (3.0, True), (4.5, False)]
+
+MIN_BOX_IOU = 0.6
+MAX_MEAN_DIFF = 8.0
+
+
+def box_mask(frame):
+    """
+    Pixels of the black subtitle box (the background clip is never that dark)
+    """
+    return frame.max(axis=2) < 40
+
+
+def iou(mask_a, mask_b):
+    union = np.logical_or(mask_a, mask_b).sum()
+    return np.logical_and(mask_a, mask_b).sum() / union if union else 1.0
+
+
+def main():
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.mp4")
+        subtitles = os.path.join(directory, "subtitles.srt")
+        moviepy_output = os.path.join(directory, "moviepy.mp4")
+        ffmpeg_output = os.path.join(directory, "ffmpeg.mp4")
+
+        ColorClip((1280, 720), color=(60, 120, 90), duration=5).set_fps(25).write_videofile(
+            source, logger=None, audio=False)
+        with open(subtitles, "w", encoding="utf-8") as file:
+            file.write(SRT)
+
+        locate.create_video(source, subtitles, moviepy_output, None, True,
+                            'archive', backend='moviepy')
+        locate.create_video(source, subtitles, ffmpeg_output, None, True,
+                            'archive', backend='ffmpeg')
+
+        moviepy_clip = VideoFileClip(moviepy_output)
+        ffmpeg_clip = VideoFileClip(ffmpeg_output)
+
+        for t, shown in SAMPLES:
+            moviepy_frame = moviepy_clip.get_frame(t)
+            ffmpeg_frame = ffmpeg_clip.get_frame(t)
+            moviepy_box = box_mask(moviepy_frame)
+            ffmpeg_box = box_mask(ffmpeg_frame)
+
+            overlap = iou(moviepy_box, ffmpeg_box)
+            diff = np.abs(moviepy_frame.astype(np.int16) - ffmpeg_frame.astype(np.int16)).mean()
+            print("t=%.1f subtitle=%-5s box IoU=%.2f mean diff=%.2f" % (t, shown, overlap, diff))
+
+            if shown != bool(moviepy_box.any()) or shown != bool(ffmpeg_box.any()):
+                failures.append("t=%.1f: subtitle visibility differs" % t)
+            if overlap < MIN_BOX_IOU:
+                failures.append("t=%.1f: subtitle boxes do not overlap enough" % t)
+            if diff > MAX_MEAN_DIFF:
+                failures.append("t=%.1f: frames differ too much" % t)
+
+    for failure in failures:
+        print("FAIL " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
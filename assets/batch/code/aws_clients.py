@@ -0,0 +1,111 @@
+"""
+Shared registry of boto3 clients with pooled connections, adaptive retries
+and a token-bucket rate limiter per service
+"""
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+from metrics import METRICS
+
+MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '32'))
+MAX_ATTEMPTS = int(os.getenv('AWS_MAX_ATTEMPTS', '10'))
+
+# Requests per second allowed per service and per process, unlisted services are not limited
+RATE_LIMITS = {
+    'polly': float(os.getenv('POLLY_TPS', '8')),
+    'translate': float(os.getenv('TRANSLATE_TPS', '10')),
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a token is available
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: tokens added per second
+        :param burst: maximum number of tokens that can accumulate (default: rate)
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, sleeping until enough of them are available
+
+        :param tokens: number of tokens to take
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_lock = threading.Lock()
+_pid = None
+_clients = {}
+_limiters = {}
+
+
+def _reset_after_fork():
+    # clients and their connection pools must not be shared with a parent process
+    global _pid
+    if _pid != os.getpid():
+        _clients.clear()
+        _limiters.clear()
+        _pid = os.getpid()
+
+
+def get_limiter(service):
+    """
+    Return the TokenBucket limiting the calls to service, or None if it is not limited
+
+    :param service: the boto3 service name (e.g. "polly")
+    """
+    with _lock:
+        _reset_after_fork()
+        if service not in _limiters:
+            rate = RATE_LIMITS.get(service)
+            _limiters[service] = TokenBucket(rate) if rate else None
+        return _limiters[service]
+
+
+def get_client(service, region=None):
+    """
+    Return the shared client for service in region, creating it on first use.
+    Every API call made through it first takes a token from the service limiter.
+
+    :param service: the boto3 service name (e.g. "polly")
+    :param region: the aws region of the client, None for the default one
+    """
+    limiter = get_limiter(service)
+
+    with _lock:
+        _reset_after_fork()
+        key = (service, region)
+        client = _clients.get(key)
+        if client is None:
+            config = Config(max_pool_connections=MAX_POOL_CONNECTIONS,
+                            retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS})
+            client = boto3.client(service, region_name=region, config=config)
+            if limiter is not None:
+                client.meta.events.register(
+                    'before-call', lambda **kwargs: limiter.acquire())
+            # after the limiter, so the recorded latency leaves out its sleep
+            METRICS.instrument(client)
+            _clients[key] = client
+        return client
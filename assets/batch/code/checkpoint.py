@@ -0,0 +1,166 @@
+"""
+Content-addressed checkpoints of the job stages, so a re-run skips the work
+an earlier run already finished
+"""
+import glob
+import hashlib
+import logging
+import os
+
+from aws_clients import get_client
+from storage import open_store
+
+# Settings that change the rendered outputs, and so belong in the checkpoint key.
+# The Polly voices, engine and sample rates are set in the code, whose version
+# is part of the key.
+OUTPUT_SETTINGS = ('AUDIO_FORMAT', 'ENCODER_PROFILE', 'RENDER_BACKEND', 'SUBTITLE_MODE',
+                   'SUBTITLE_MAX_WORDS', 'SUBTITLE_MAX_SECONDS', 'SUBTITLE_MAX_GAP',
+                   'DRAFT_HEIGHT', 'DRAFT_FPS')
+
+
+class Checkpoints:
+    """
+    Stage outputs of one job stored under a key derived from everything they
+    depend on: the source video ETag, the transcript hash, the code version
+    and the output settings. The file name of an output names the stage and
+    its language (e.g. "audio-es.mp3"). Without a store every lookup misses
+    and nothing is saved.
+    """
+
+    def __init__(self, store=None, *inputs):
+        """
+        :param store: optional persistent store (see storage.open_store)
+        :param inputs: the strings the outputs of the job depend on
+        """
+        self.store = store
+        digest = hashlib.sha256()
+        for part in inputs:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        self.prefix = digest.hexdigest()
+        self.restored = 0
+        self.saved = 0
+
+    def key(self, name):
+        """
+        Return the store key of a stage output
+
+        :param name: the file name of the output (e.g. "video-es.mp4")
+        """
+        return self.prefix + '/' + name
+
+    def restore(self, file_name):
+        """
+        Fetch a finished stage output into file_name
+
+        :param file_name: the output of the stage (e.g. "subtitles-es.srt")
+        :return: True if the output was restored and the stage can be skipped
+        """
+        if self.store is None or not self.store.get_file(self.key(file_name), file_name):
+            return False
+        logging.info("\t==> Restored %s from checkpoint" % file_name)
+        self.restored += 1
+        return True
+
+    def save(self, file_name):
+        """
+        Store the output of a finished stage
+
+        :param file_name: the output of the stage
+        """
+        if self.store is not None:
+            self.store.put_file(self.key(file_name), file_name)
+            self.saved += 1
+
+    def done(self, name):
+        """
+        Return True if the stage without a file output, e.g. an upload, finished
+
+        :param name: the name of the stage (e.g. "upload/talk-es.mp4")
+        """
+        return self.store is not None and self.store.exists(self.key(name))
+
+    def mark_done(self, name):
+        """
+        Record that a stage without a file output finished
+
+        :param name: the name of the stage
+        """
+        if self.store is not None:
+            self.store.put(self.key(name), b'')
+
+    def log_stats(self):
+        """
+        Log how many stage outputs were restored and saved
+        """
+        logging.info("\t==> Checkpoints: %d restored, %d saved" % (self.restored, self.saved))
+
+
+def code_version():
+    """
+    Return CODE_VERSION, or else a hash of the Python sources next to this module
+    """
+    version = os.getenv('CODE_VERSION')
+    if version:
+        return version
+    digest = hashlib.sha256()
+    for file_name in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.py'))):
+        with open(file_name, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def video_etag(input_file_name):
+    """
+    Return the ETag of the source video, or of any other S3 object
+
+    :param input_file_name: the video in format s3://bucket/key
+    """
+    bucket_name, object_name = input_file_name[5:].split('/', 1)
+    return get_client('s3').head_object(Bucket=bucket_name, Key=object_name)['ETag']
+
+
+def file_hash(file_name):
+    """
+    Return the SHA-256 of a local file
+
+    :param file_name: the file to hash
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def checkpoints_from_env(invideo, transcript_file_name):
+    """
+    Build the Checkpoints of a job stored at CHECKPOINT_URI (s3://bucket/prefix
+    or local directory), disabled when it is not set
+
+    :param invideo: the source video in format s3://bucket/key
+    :param transcript_file_name: the downloaded Amazon Transcribe output
+    """
+    location = os.getenv('CHECKPOINT_URI')
+    if not location:
+        return Checkpoints()
+    settings = ["%s=%s" % (name, os.getenv(name, '')) for name in OUTPUT_SETTINGS]
+    return Checkpoints(open_store(location), video_etag(invideo),
+                       file_hash(transcript_file_name), code_version(), *settings)
+
+
+def shared_from_env(invideo, insubtitles):
+    """
+    Build the Checkpoints the prepare stage of an array job publishes the
+    intermediates every language needs to, and the language children restore
+    them from, stored at SHARED_URI (s3://bucket/prefix or local directory)
+
+    :param invideo: the source video in format s3://bucket/key
+    :param insubtitles: the Amazon Transcribe output in format s3://bucket/key
+    """
+    location = os.getenv('SHARED_URI')
+    if not location:
+        raise ValueError("SHARED_URI must be set to split a job into array children")
+    # a transcript reviewed again under the same name gets a new ETag
+    return Checkpoints(open_store(location), invideo, insubtitles,
+                       video_etag(insubtitles), code_version())
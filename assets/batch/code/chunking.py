@@ -0,0 +1,62 @@
+"""
+Split long texts into sentence-aligned chunks that fit AWS service limits
+"""
+import re
+
+SENTENCE_END = re.compile(r'(?<=[.!?。！？])\s+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def chunk_text(text, limit, measure=len):
+    """
+    Split text into consecutive chunks of at most limit, cutting on sentence
+    boundaries when possible, then on whitespace, then anywhere.
+
+    :param text: the text to split
+    :param limit: the maximum size of a chunk, as returned by measure
+    :param measure: function returning the size of a string (e.g. its UTF-8 length)
+    :return: list of (start, end) character offsets of the chunks in text
+    """
+    chunks = []
+    chunk_start = chunk_end = 0
+
+    for start, end in _pieces(text, limit, measure):
+        if chunk_end > chunk_start and measure(text[chunk_start:end]) > limit:
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = start
+        chunk_end = end
+
+    if chunk_end > chunk_start:
+        chunks.append((chunk_start, chunk_end))
+    return chunks
+
+
+def _pieces(text, limit, measure):
+    """
+    Yield the (start, end) offsets of the sentences in text, with sentences
+    larger than limit broken down into words or hard cuts
+    """
+    for start, end in _split(text, 0, len(text), SENTENCE_END):
+        if measure(text[start:end]) <= limit:
+            yield start, end
+            continue
+        for word_start, word_end in _split(text, start, end, WHITESPACE):
+            while measure(text[word_start:word_end]) > limit:
+                cut = word_start + 1
+                while cut < word_end and measure(text[word_start:cut + 1]) <= limit:
+                    cut += 1
+                yield word_start, cut
+                word_start = cut
+            yield word_start, word_end
+
+
+def _split(text, start, end, separator):
+    """
+    Yield the (start, end) offsets of the parts of text[start:end] between separators
+    """
+    for match in separator.finditer(text, start, end):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if end > start:
+        yield start, end
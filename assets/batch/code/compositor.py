@@ -0,0 +1,146 @@
+"""
+Single-pass subtitle compositing for MoviePy clips
+"""
+import bisect
+
+
+class SubtitleIndex:
+    """
+    Sorted interval index over the entries of an SRT file, built once and
+    queried for every frame of the video.
+    """
+
+    def __init__(self, subtitles, duration=None):
+        """
+        :param subtitles: list of ((start, end), text) tuples, as returned by file_to_subtitles
+        :param duration: optional upper bound for the end of every interval (e.g. clip duration)
+        """
+        self.starts = []
+        self.ends = []
+        self.texts = []
+
+        for (start, end), txt in sorted(subtitles, key=lambda sub: sub[0][0]):
+            if duration is not None:
+                if start >= duration:
+                    continue
+                end = min(end, duration)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.texts.append(txt)
+
+    @classmethod
+    def from_srt(cls, subtitles_file_name, duration=None):
+        """
+        Build the index straight from an SRT file
+
+        :param subtitles_file_name: the filename of the SRT file (e.g. "mySRT.srt")
+        :param duration: optional upper bound for the end of every interval
+        """
+        from moviepy.video.tools.subtitles import file_to_subtitles
+
+        return cls(file_to_subtitles(subtitles_file_name), duration)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, t):
+        """
+        Return the text of the subtitle active at time t, or None
+
+        :param t: the time in seconds
+        """
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i >= 0 and t < self.ends[i]:
+            return self.texts[i]
+        return None
+
+
+def overlay_position(frame_size, overlay, pos=('center', 50)):
+    """
+    Resolve a MoviePy style position into integer pixel coordinates
+
+    :param frame_size: (width, height) of the background frame
+    :param overlay: the overlay image array
+    :param pos: position of the overlay, in the same form as Clip.set_pos
+    """
+    frame_w, frame_h = frame_size
+    overlay_h, overlay_w = overlay.shape[:2]
+    x, y = pos
+    if x == 'center':
+        x = (frame_w - overlay_w) / 2
+    if y == 'center':
+        y = (frame_h - overlay_h) / 2
+    return int(x), int(y)
+
+
+def blit_overlay(frame, overlay, pos):
+    """
+    Draw the overlay onto a copy of the frame at pos, cropping at the edges.
+    RGBA overlays are alpha blended, RGB overlays are copied as-is.
+
+    :param frame: the background frame (H x W x 3)
+    :param overlay: the overlay image (h x w x 3 or h x w x 4)
+    :param pos: (x, y) integer position of the overlay's top-left corner
+    """
+    x, y = pos
+    frame_h, frame_w = frame.shape[:2]
+    overlay_h, overlay_w = overlay.shape[:2]
+
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + overlay_w, frame_w), min(y + overlay_h, frame_h)
+    if x1 >= x2 or y1 >= y2:
+        return frame
+
+    out = frame.copy()
+    patch = overlay[y1 - y:y2 - y, x1 - x:x2 - x]
+    if patch.shape[2] == 4:
+        alpha = patch[:, :, 3:] / 255.0
+        out[y1:y2, x1:x2] = (alpha * patch[:, :, :3] +
+                             (1 - alpha) * out[y1:y2, x1:x2])
+    else:
+        out[y1:y2, x1:x2] = patch
+    return out
+
+
+def make_subtitle_blender(frame_size, index, render_overlay, pos=('center', 50)):
+    """
+    Return a function blend(frame, t) that draws the subtitle active at
+    time t on the frame. Every distinct subtitle text is rendered once
+    up-front by render_overlay.
+
+    :param frame_size: (width, height) of the frames to draw on
+    :param index: the SubtitleIndex to take the subtitles from
+    :param render_overlay: function turning a text into an RGB or RGBA image array
+    :param pos: position of the subtitles on the frame
+    """
+    overlays = {}
+    for txt in index.texts:
+        if txt not in overlays:
+            overlay = render_overlay(txt)
+            if overlay.shape[2] == 4 and overlay[:, :, 3].min() == 255:
+                # fully opaque, no need to blend on every frame
+                overlay = overlay[:, :, :3]
+            overlays[txt] = (overlay, overlay_position(frame_size, overlay, pos))
+
+    def blend(frame, t):
+        txt = index.lookup(t)
+        if txt is None:
+            return frame
+        overlay, overlay_pos = overlays[txt]
+        return blit_overlay(frame, overlay, overlay_pos)
+
+    return blend
+
+
+def composite_subtitles(clip, index, render_overlay, pos=('center', 50)):
+    """
+    Return a clip that draws the active subtitle on every frame of the
+    source clip in one sequential pass.
+
+    :param clip: the source VideoClip
+    :param index: the SubtitleIndex to take the subtitles from
+    :param render_overlay: function turning a text into an RGB or RGBA image array
+    :param pos: position of the subtitles on the frame
+    """
+    blend = make_subtitle_blender(clip.size, index, render_overlay, pos)
+    return clip.fl(lambda get_frame, t: blend(get_frame(t), t))
@@ -0,0 +1,106 @@
+"""
+Named encoder profiles for the videos written by MoviePy
+"""
+import os
+
+ENCODER_PROFILES = {
+    'fast': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 28,
+             'audio_codec': 'aac', 'audio_bitrate': '96k'},
+    'balanced': {'codec': 'libx264', 'preset': 'medium', 'crf': 23,
+                 'audio_codec': 'aac', 'audio_bitrate': '128k'},
+    'archive': {'codec': 'libx264', 'preset': 'slow', 'crf': 18,
+                'audio_codec': 'aac', 'audio_bitrate': '192k'},
+}
+
+DEFAULT_PROFILE = 'balanced'
+
+# Draft renders for the review step: the fastest profile, at most
+# DRAFT_HEIGHT pixels high and DRAFT_FPS frames per second
+DRAFT_PROFILE = 'fast'
+
+
+def get_encoder_profile(name=None):
+    """
+    Return the encoder profile called name, by default the one selected by
+    the ENCODER_PROFILE environment variable
+
+    :param name: the name of the profile (e.g. "fast")
+    """
+    name = name or os.getenv('ENCODER_PROFILE', DEFAULT_PROFILE)
+    if name not in ENCODER_PROFILES:
+        raise ValueError("Unknown encoder profile: " + name)
+    profile = dict(ENCODER_PROFILES[name], name=name)
+    profile['threads'] = int(os.getenv('ENCODER_THREADS', str(os.cpu_count() or 1)))
+    return profile
+
+
+def get_draft_height():
+    """
+    Return DRAFT_HEIGHT, the largest height of a draft in pixels
+    """
+    return int(os.getenv('DRAFT_HEIGHT', '360'))
+
+
+def get_draft_fps():
+    """
+    Return DRAFT_FPS, the largest frame rate of a draft
+    """
+    return float(os.getenv('DRAFT_FPS', '12'))
+
+
+def draft_size(video_size):
+    """
+    Return the (width, height) of the draft of a video of video_size: scaled
+    down to DRAFT_HEIGHT, never up, with the even sides yuv420p needs
+
+    :param video_size: the (width, height) of the video
+    """
+    width, height = video_size
+    scale = min(1.0, get_draft_height() / height)
+    return int(width * scale) // 2 * 2, int(height * scale) // 2 * 2
+
+
+def write_videofile_params(profile):
+    """
+    Return the write_videofile keyword arguments for the profile
+
+    :param profile: an encoder profile, as returned by get_encoder_profile
+    """
+    return {'codec': profile['codec'], 'preset': profile['preset'],
+            'threads': profile['threads'],
+            'ffmpeg_params': ['-crf', str(profile['crf'])],
+            'audio_codec': profile['audio_codec'],
+            'audio_bitrate': profile['audio_bitrate']}
+
+
+def audio_encoder_params(profile):
+    """
+    Return the ffmpeg arguments encoding the audio with the profile
+
+    :param profile: an encoder profile, as returned by get_encoder_profile
+    """
+    return ['-c:a', profile['audio_codec'], '-b:a', profile['audio_bitrate']]
+
+
+def video_writer_params(profile):
+    """
+    Return the FFMPEG_VideoWriter keyword arguments for the profile
+
+    :param profile: an encoder profile, as returned by get_encoder_profile
+    """
+    return {'codec': profile['codec'], 'preset': profile['preset'],
+            'threads': profile['threads'],
+            'ffmpeg_params': ['-crf', str(profile['crf'])]}
+
+
+def audio_file_params(profile):
+    """
+    Return the write_audiofile keyword arguments and the file extension for
+    the audio of the profile
+
+    :param profile: an encoder profile, as returned by get_encoder_profile
+    """
+    from moviepy.tools import find_extension
+
+    return ({'codec': profile['audio_codec'], 'bitrate': profile['audio_bitrate']},
+            find_extension(profile['audio_codec']))
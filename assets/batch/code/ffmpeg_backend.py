@@ -0,0 +1,203 @@
+"""
+Video operations done by a single ffmpeg invocation instead of MoviePy
+"""
+import logging
+import os
+import subprocess
+
+from pcm import PCM_TRACKS
+
+# libass lays SRT subtitles out on a 288 pixel high canvas and scales it to the video
+ASS_PLAY_RES_Y = 288
+
+# ISO 639-2 codes, which is what the MP4 container stores as track language
+ISO_639_2 = {
+    'de': 'deu', 'en': 'eng', 'es': 'spa', 'fr': 'fra', 'it': 'ita',
+    'ja': 'jpn', 'ko': 'kor', 'pl': 'pol', 'pt': 'por',
+}
+
+
+def run_ffmpeg(args, input=None):
+    """
+    Run the ffmpeg binary MoviePy is configured with, raising on failure
+
+    :param args: the ffmpeg arguments, without the binary
+    :param input: bytes written to the standard input of ffmpeg, read by a pipe:0 input
+    """
+    # moviepy.config probes for ffmpeg and ImageMagick when it is imported
+    from moviepy.config import get_setting
+
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error"] + args
+    logging.info("\t==> Running: " + " ".join(cmd))
+    subprocess.run(cmd, input=input, check=True)
+
+
+def has_audio(video_file_name):
+    """
+    Return True if the video file has an audio stream
+
+    :param video_file_name: the video file to probe
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    return ffmpeg_parse_infos(video_file_name)['audio_found']
+
+
+def remux_soft_subtitles(video_file_name, subtitle_tracks, output_file_name, audio_tracks=()):
+    """
+    Mux SRT files as selectable mov_text subtitle tracks, and optionally extra
+    audio tracks, into an MP4 while copying the original streams unchanged
+
+    :param video_file_name: the original content (e.g. "video.mp4")
+    :param subtitle_tracks: list of (language code, SRT file name) tuples
+    :param output_file_name: the MP4 file to write
+    :param audio_tracks: list of (language code, audio file name) tuples added after the original audio
+    """
+    inputs = ["-i", video_file_name]
+    maps = ["-map", "0:v"]
+    metadata = []
+
+    audio_index = 0
+    if has_audio(video_file_name):
+        maps += ["-map", "0:a"]
+        audio_index = 1
+
+    for n, (lang, file_name) in enumerate(subtitle_tracks):
+        inputs += ["-i", file_name]
+        maps += ["-map", "%d:s" % (n + 1)]
+        metadata += ["-metadata:s:s:%d" % n, "language=" + ISO_639_2.get(lang, lang)]
+
+    codecs = ["-c:v", "copy", "-c:a", "copy", "-c:s", "mov_text"]
+    for n, (lang, file_name) in enumerate(audio_tracks):
+        inputs += ["-i", file_name]
+        maps += ["-map", "%d:a" % (len(subtitle_tracks) + n + 1)]
+        metadata += ["-metadata:s:a:%d" % (audio_index + n),
+                     "language=" + ISO_639_2.get(lang, lang)]
+        if file_name.endswith(".wav"):
+            # MP4 does not carry PCM, so these tracks are encoded
+            codecs += ["-c:a:%d" % (audio_index + n), "aac"]
+
+    run_ffmpeg(inputs + maps + codecs + metadata + [output_file_name])
+
+
+def ass_style(font, fontsize, txt_color, video_height, margin_top=50):
+    """
+    Return the libass force_style that matches annotate: text of the given
+    ImageMagick font and pixel size on an opaque black box, centered
+    margin_top pixels below the top of the frame
+
+    :param font: the ImageMagick font name (e.g. "Arial-Bold")
+    :param fontsize: the size of the font in video pixels
+    :param txt_color: the color of the text, "white" or "#RRGGBB"
+    :param video_height: the height of the video in pixels
+    :param margin_top: the distance between the top of the frame and the box
+    """
+    words = font.split('-')
+    bold = 'Bold' in words
+    italic = 'Italic' in words
+    name = " ".join(word for word in words if word not in ('Bold', 'Italic'))
+
+    scale = ASS_PLAY_RES_Y / video_height
+    return ",".join([
+        "FontName=" + name,
+        "FontSize=%d" % round(fontsize * scale),
+        "Bold=%d" % (-1 if bold else 0),
+        "Italic=%d" % (-1 if italic else 0),
+        "PrimaryColour=" + ass_color(txt_color),
+        # BorderStyle 3 draws an opaque box in the outline colour
+        "BorderStyle=3",
+        "OutlineColour=&H00000000",
+        "BackColour=&H00000000",
+        "Outline=1",
+        "Shadow=0",
+        # force_style takes the legacy SSA alignment: 2 is center, +4 is top
+        "Alignment=6",
+        "MarginV=%d" % round(margin_top * scale),
+    ])
+
+
+def ass_color(color):
+    """
+    Convert "white" or "#RRGGBB" into the &HAABBGGRR notation of ASS
+
+    :param color: the color to convert
+    """
+    names = {'white': '#FFFFFF', 'black': '#000000', 'yellow': '#FFFF00'}
+    rgb = names.get(color, color).lstrip('#')
+    return "&H00%s%s%s" % (rgb[4:6], rgb[2:4], rgb[0:2])
+
+
+def quote_filter_value(value):
+    """
+    Check a value for use inside a single-quoted ffmpeg filter option, where
+    everything but the quote itself is taken literally
+
+    :param value: the option value
+    """
+    if "'" in value:
+        raise ValueError("Quotes are not supported in filter options: " + value)
+    return value
+
+
+def render_burned_subtitles(original_clip_name, subtitles_file_name, output_file_name,
+                            alternate_audio_file_name, use_original_audio, profile,
+                            font='Space-Mono-Italic-for-Powerline', fontsize=24,
+                            txt_color='white', size=None, fps=None):
+    """
+    Burn the SRT into the video with the libass subtitles filter and, unless
+    use_original_audio is set, replace the audio track, in one ffmpeg run
+
+    :param original_clip_name: the filename of the original content (e.g. "originalVideo.mp4")
+    :param subtitles_file_name: the filename of the SRT file (e.g. "mySRT.srt")
+    :param output_file_name: the filename of the output video file
+    :param alternate_audio_file_name: the filename of an MP3 file, or of a track kept in memory, that replaces the audio track
+    :param use_original_audio: whether to keep the original audio track
+    :param profile: the encoder profile, as returned by encoding.get_encoder_profile
+    :param font: the ImageMagick name of the font, as used by annotate
+    :param fontsize: the size of the font in video pixels
+    :param txt_color: the color of the text
+    :param size: (width, height) to scale the video to, None to keep its size
+    :param fps: frame rate to resample the video to, None to keep its frame rate
+    :return: the number of frames encoded
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(original_clip_name)
+    video_height = infos['video_size'][1]
+
+    # The style is relative to the frame height, so subtitles burned after
+    # the scale keep the proportions of a full size render
+    filters = []
+    if size is not None:
+        filters.append("scale=%d:%d" % size)
+    if fps is not None:
+        filters.append("fps=%g" % fps)
+
+    # libass fails on an SRT without entries, which is just a video with no subtitles
+    if os.path.getsize(subtitles_file_name) > 0:
+        filters.append("subtitles=filename='%s':force_style='%s'" % (
+            quote_filter_value(subtitles_file_name),
+            quote_filter_value(ass_style(font, fontsize, txt_color, video_height))))
+    if filters:
+        filters = ["-vf", ",".join(filters)]
+
+    args = ["-i", original_clip_name]
+    audio = None
+    if use_original_audio:
+        maps = ["-map", "0:v", "-map", "0:a?"]
+    else:
+        # a track kept in memory is piped to ffmpeg instead of read from a file
+        audio_input, audio = PCM_TRACKS.ffmpeg_input(alternate_audio_file_name)
+        args += audio_input
+        maps = ["-map", "0:v", "-map", "1:a"]
+
+    run_ffmpeg(args + maps + filters + [
+        "-c:v", profile['codec'], "-preset", profile['preset'],
+        "-crf", str(profile['crf']), "-threads", str(profile['threads']),
+        "-pix_fmt", "yuv420p",
+        "-c:a", profile['audio_codec'], "-b:a", profile['audio_bitrate'],
+        "-t", str(infos['duration']),
+        output_file_name], input=audio)
+    if fps is not None:
+        return int(infos['duration'] * fps)
+    return infos['video_nframes']
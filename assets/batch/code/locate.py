@@ -1,23 +1,84 @@
 """
 Get the localization of video
 """
-import codecs
+import bisect
+import io
 import json
 import logging
 import os
 import re
 import sys
-from contextlib import closing
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, closing
 from time import gmtime, strftime
 
-import boto3
-from botocore.exceptions import ClientError
-from moviepy import editor
-from moviepy.editor import *
-from moviepy.video.tools.subtitles import SubtitlesClip
+from aws_clients import get_client
+from checkpoint import checkpoints_from_env, shared_from_env
+from chunking import chunk_text
+from compositor import SubtitleIndex, composite_subtitles, make_subtitle_blender
+from encoding import (DRAFT_PROFILE, audio_encoder_params, audio_file_params, draft_size,
+                      get_draft_fps, get_encoder_profile, video_writer_params,
+                      write_videofile_params)
+from ffmpeg_backend import remux_soft_subtitles, render_burned_subtitles
+from metrics import METRICS, collect
+from mp3info import audio_frames, mp3_duration
+from pcm import PCM_SAMPLE_RATE, PCM_TRACKS, STREAM_CHUNK_BYTES, get_audio_format, read_stream
+from processes import process_pool
+from segmenter import segment_transcript
+from segments import concat_segments, mux_audio, split_srt, split_video
+from srt import format_time_code, format_time_codes, write_srt_file
+from textcache import TEXT_CACHE
+from transcript import Transcript, load_transcript
+from transfer import BackgroundTransfers, download_file_from_s3
+from translation_cache import TRANSLATION_CACHE
+from translator import translate_chunked
+
+
+# Maximum number of characters Amazon Polly accepts in one synthesize_speech request
+POLLY_MAX_CHARS = 2900
+
+
+def get_polly_concurrency():
+    """
+    Return POLLY_CONCURRENCY, the maximum number of synthesize_speech requests
+    in flight for one audio track. Like the other job settings below it is
+    read on every call, so each job of a warm worker gets its own.
+    """
+    return int(os.getenv('POLLY_CONCURRENCY', '4'))
+
 
+def get_segment_seconds():
+    """
+    Return SEGMENT_SECONDS, the length in seconds of the segments a video is
+    split into to render them in parallel (0 renders the whole timeline in one process)
+    """
+    return float(os.getenv('SEGMENT_SECONDS', '0'))
 
-logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+
+def get_segment_workers():
+    """
+    Return SEGMENT_WORKERS, the number of segments rendered at the same time
+    """
+    return int(os.getenv('SEGMENT_WORKERS', str(os.cpu_count() or 1)))
+
+
+def get_subtitle_limits():
+    """
+    Return the limits of a subtitle phrase of the transcript: SUBTITLE_MAX_WORDS
+    words, SUBTITLE_MAX_SECONDS seconds, and the SUBTITLE_MAX_GAP silence in
+    seconds that always starts a new phrase (unset: no limit)
+    """
+    return (int(os.getenv('SUBTITLE_MAX_WORDS', '10')),
+            float(os.getenv('SUBTITLE_MAX_SECONDS', '0')) or None,
+            float(os.getenv('SUBTITLE_MAX_GAP', '0')) or None)
+
+# Intermediates the prepare stage of an array job publishes for the language children
+SHARED_FILES = ("transcribe.json", "transcript.pickle", "subtitles-en.srt")
+
+# Words are separated by a space, punctuation is not
+WORD_START = re.compile('[a-zA-Z0-9]')
 
 
 def new_phrase():
@@ -35,98 +96,63 @@ def get_time_code(seconds):
     return: the formatted string in HH:MM:SS,mmm format
 
     """
-    t_hund = int(seconds % 1 * 1000)
-    t_seconds = int(seconds)
-    t_secs = ((float(t_seconds) / 60) % 1) * 60
-    t_mins = int(t_seconds / 60)
-    return f"00:{t_mins:02d}:{int(t_secs):02d},{t_hund:03d}"
+    return format_time_code(seconds)
 
 
+@METRICS.measure('transcript_srt')
 def write_transcript_to_srt(transcript, srt_file_name):
     """
     Function to get the phrases from the transcript and write it out to an SRT file
 
-    param: transcript: the JSON output from Amazon Transcribe
-    param: source_lang_code: the language code for the original content (e.g. English = "EN")
+    param: transcript: the Transcript (or the file name of the JSON output from Amazon Transcribe)
     param: srtFileName: the name of the SRT file (e.g. "mySRT.SRT")
 
     """
 
     # Write the SRT file for the original language
     logging.info("==> Creating SRT from transcript")
-    phrases = get_phrases_from_transcript(transcript)
-    write_srt(phrases, srt_file_name)
+    starts, ends, texts = segment_transcript(
+        load_transcript(transcript), *get_subtitle_limits())
+    logging.info("==> Writing %d phrases to disk..." % len(texts))
+    write_srt_file(starts, ends, texts, srt_file_name)
 
 
 def get_phrases_from_transcript(transcript):
     """
     Based on the JSON transcript provided by Amazon Transcribe,
           get the phrases from the translation
-          and write it out to an SRT file
 
-    param: transcript: the JSON output from Amazon Transcribe
+    param: transcript: the Transcript (or the file name of the JSON output from Amazon Transcribe)
 
     This function is intended to be called with the JSON
     structure output from the Transcribe service.  However,
     if you only have the translation of the transcript,
     then you should call get_phrases_from_translation instead
     """
-
-    with open(transcript, 'r', encoding='utf-8') as file:
-        data = file.read()
-    transcript_contnet = json.loads(data)
-    # Now create phrases from the translation
-    items = transcript_contnet['results']['items']
-
-    # set up some variables for the first pass
-    phrase = new_phrase()
-    phrases = []
-    n_phrase = True
-    counter_x = 0
-    counter_c = 0
-
     logging.info("==> Creating phrases from transcript...")
 
-    for item in items:
-
-        # if it is a new phrase, then get the start_time of the first item
-        if n_phrase is True:
-            if item["type"] == "pronunciation":
-                phrase["start_time"] = get_time_code(float(item["start_time"]))
-                n_phrase = False
-            counter_c += 1
-        else:
-            # get the end_time if the item is a pronuciation and store it
-            # We need to determine if this pronunciation or puncuation here
-            # Punctuation doesn't contain timing information, so we'll want
-            # to set the end_time to whatever the last word in the phrase is.
-            if item["type"] == "pronunciation":
-                phrase["end_time"] = get_time_code(float(item["end_time"]))
-
-        # in either case, append the word to the phrase...
-        phrase["words"].append(item['alternatives'][0]["content"])
-        counter_x += 1
-
-        # now add the phrase to the phrases, generate a new phrase, etc.
-        if counter_x == 10:
-            phrases.append(phrase)
-            phrase = new_phrase()
-            n_phrase = True
-            counter_x = 0
+    starts, ends, texts = segment_transcript(
+        load_transcript(transcript), *get_subtitle_limits())
 
-    return phrases
+    return [{'start_time': start_time, 'end_time': end_time, 'words': [text]}
+            for start_time, end_time, text in
+            zip(format_time_codes(starts), format_time_codes(ends), texts)]
 
 
-def write_translation_to_srt(transcript, source_lang_code, target_lang_code, srt_file_name, region):
+@METRICS.measure('translation')
+def write_translation_to_srt(transcript, source_lang_code, target_lang_code, srt_file_name, region,
+                             chunk_durations=None):
     """
     Based on the JSON transcript provided by Amazon Transcribe,
     get the phrases from the translation and write it out to an SRT file
 
-    param: transcript: The JSON output from Amazon Transcribe.
+    param: transcript: The Transcript (or the file name of the JSON output from Amazon Transcribe).
     param: source_lang_code: The language code for the original content (e.g. English = "EN").
     param: target_lang_code: The language code for the translated content (e.g. Spanish = "ES").
     param: srt_file_name: The name of the SRT file (e.g. "mySRT.srt").
     param: region: The name of the region
+    param: chunk_durations: optional durations of the synthesized audio chunks,
+                            as returned by create_audio_track_from_translation
     """
 
     # First get the translation
@@ -138,11 +164,13 @@ def write_translation_to_srt(transcript, source_lang_code, target_lang_code, srt
     # Now create phrases from the translation
     text_to_translate = translation["TranslatedText"]
     phrases = get_phrases_from_translation(
-        text_to_translate, target_lang_code, region)
+        text_to_translate, target_lang_code, region,
+        [chunk[2] for chunk in translation["Chunks"]], chunk_durations)
     write_srt(phrases, srt_file_name)
 
 
-def get_phrases_from_translation(translation, target_lang_code, region):
+def get_phrases_from_translation(translation, target_lang_code, region, chunk_starts=None,
+                                 chunk_durations=None):
     """
     Based on the JSON translation provided by Amazon Translate,
     get the phrases from the translation and write it out to an SRT file.
@@ -151,69 +179,125 @@ def get_phrases_from_translation(translation, target_lang_code, region):
     the output of Transcribe, we will need to calculate the start and end-time
     for each phrase.
 
+    The timing comes from the word-level speech marks Amazon Polly returns
+    for the whole translation, so the number of Polly calls does not depend
+    on the number of phrases.
+
     param: translation: The JSON output from Amazon Translate.
     param: target_lang_code: The language code for the translated content (e.g. Spanish = "ES").
+    param: region: The AWS region in which to run Amazon Polly.
+    param: chunk_starts: optional offsets in translation where a translated
+                         chunk begins, no phrase straddles two chunks
+    param: chunk_durations: optional durations of the synthesized audio chunks
+                            (see get_speech_marks)
     """
     # Now create phrases from the translation
-    words = translation.split()
+    words = list(re.finditer(r'\S+', translation))
+
+    logging.info("==> Creating phrases from translation...")
+
+    mark_offsets, mark_times, duration = get_speech_marks(
+        translation, target_lang_code, region, chunk_durations)
+
+    def word_time(word):
+        # the time of the last speech mark starting within or before the word
+        i = bisect.bisect_right(mark_offsets, word.end() - 1) - 1
+        return mark_times[i] if i >= 0 else 0.0
+
+    # phrases of up to 10 words, restarting at every translated chunk
+    chunk_starts = sorted(chunk_starts or [0])
+    firsts = []
+    chunk = None
+    for i, word in enumerate(words):
+        word_chunk = bisect.bisect_right(chunk_starts, word.start()) - 1
+        if not firsts or word_chunk != chunk or i - firsts[-1] == 10:
+            firsts.append(i)
+            chunk = word_chunk
 
-    # set up some variables for the first pass
-    phrase = new_phrase()
     phrases = []
-    n_phrase = True
-    counter_x = 0
-    counter_c = 0
     seconds = 0
+    for first, last in zip(firsts, firsts[1:] + [len(words)]):
+        phrase = new_phrase()
+        phrase["words"] = [word.group() for word in words[first:last]]
+        phrase["start_time"] = get_time_code(seconds)
+
+        # the phrase lasts until the next phrase starts to be spoken
+        if last < len(words):
+            seconds = max(seconds, word_time(words[last]))
+        else:
+            seconds = max(seconds, duration)
+        phrase["end_time"] = get_time_code(seconds)
 
-    logging.info("==> Creating phrases from translation...")
-
-    for word in words:
-
-        # if it is a new phrase, then get the start_time of the first item
-        if n_phrase is True:
-            phrase["start_time"] = get_time_code(seconds)
-            n_phrase = False
-            counter_c += 1
-
-        # Append the word to the phrase...
-        phrase["words"].append(word)
-        counter_x += 1
-
-        # now add the phrase to the phrases, generate a new phrase, etc.
-        if counter_x == 10:
-
-            # For Translations, we now need to calculate the end time for the phrase
-            psecs = get_seconds_from_translation(get_phrase_text(
-                phrase), target_lang_code, "phraseAudio" + str(counter_c) + ".mp3", region)
-            seconds += psecs
-            phrase["end_time"] = get_time_code(seconds)
-
-            phrases.append(phrase)
-            phrase = new_phrase()
-            n_phrase = True
-            # seconds += .001
-            counter_x = 0
-
-        # This if statement is to address a defect in the SubtitleClip.
-        # If the Subtitles end up being
-        # a different duration than the content, MoviePy will
-        # sometimes fail with unexpected errors while
-        # processing the subclip.   This is limiting it to something
-        # less than the total duration for our example
-        # however, you may need to modify or eliminate this line
-        # depending on your content.
-        if counter_c == 30:
-            break
+        phrases.append(phrase)
 
     return phrases
 
 
+def get_speech_marks(text, target_lang_code, region, chunk_durations=None):
+    """
+    Ask Amazon Polly for the word speech marks of text, in as few requests as
+    the service limit allows (sentence-aligned chunks of POLLY_MAX_CHARS).
+
+    The marks of a chunk are relative to its own audio, so they are shifted by
+    the durations of the chunks before it. With the durations of the chunks
+    the audio track was synthesized in, the marks stay in sync with it however
+    long the text; without them the length of a chunk is estimated from its
+    marks, and the error adds up from one chunk to the next.
+
+    param: text: The text that will be synthesized.
+    param: target_lang_code: The language code used for the target Amazon Polly output.
+    param: region: The AWS region in which to run Amazon Polly.
+    param: chunk_durations: optional duration in seconds of the audio of every chunk
+    return: (offsets, times, duration) with the character offset in text and the
+            time in seconds of every word mark, and the total duration
+    """
+    client = get_client('polly', region)
+    voice_id = get_voice_id(target_lang_code)
+
+    spans = chunk_text(text, POLLY_MAX_CHARS)
+    if chunk_durations is not None and len(chunk_durations) != len(spans):
+        logging.warning("\t==> %d chunk durations for %d chunks, estimating them"
+                        % (len(chunk_durations), len(spans)))
+        chunk_durations = None
+
+    offsets = []
+    times = []
+    elapsed = 0.0
+    for n, (start, end) in enumerate(spans):
+        chunk = text[start:end]
+        response = client.synthesize_speech(
+            OutputFormat="json", SpeechMarkTypes=["word"], Text=chunk, VoiceId=voice_id)
+        with closing(response["AudioStream"]) as stream:
+            marks = [json.loads(line) for line in stream.read().splitlines() if line.strip()]
+
+        # speech marks address the text in UTF-8 bytes, map them back to characters
+        byte_to_char = []
+        for i, char in enumerate(chunk):
+            byte_to_char.extend([i] * len(char.encode('utf-8')))
+
+        chunk_times = [mark["time"] / 1000.0 for mark in marks]
+        offsets.extend(start + byte_to_char[min(mark["start"], len(byte_to_char) - 1)]
+                       for mark in marks)
+        times.extend(elapsed + t for t in chunk_times)
+
+        if chunk_durations is not None:
+            elapsed += chunk_durations[n]
+        # Polly does not report the length of the last word, assume an average one
+        elif len(chunk_times) > 1:
+            elapsed += chunk_times[-1] + (chunk_times[-1] - chunk_times[0]) / (len(chunk_times) - 1)
+        elif chunk_times:
+            elapsed += chunk_times[-1] + 0.5
+
+    logging.info("\t==> Got %d speech marks, %.2f seconds" % (len(times), elapsed))
+    return offsets, times, elapsed
+
+
 def translate_transcript(transcript, source_lang_code, target_lang_code, region):
     """
     Based on the JSON transcript provided by Amazon Transcribe,
     get the JSON response of translated text
 
-    param: transcript: The JSON output from Amazon Transcribe.
+    param: transcript: The Transcript (or the file name of the JSON output from Amazon Transcribe).
     param: source_lang_code: The language code for the original content (e.g. English = "EN").
     param: target_lang_code: The language code for the translated content (e.g. Spanish = "ES").
     param: region: The AWS region in which to run the Translation (e.g. "us-east-1").
@@ -223,26 +307,33 @@ def translate_transcript(transcript, source_lang_code, target_lang_code, region)
     # the full context of what is said vs. 1 phrase at a time.
     # This really matters in some lanaguages
 
-    # stringify the transcript
-    with open(transcript, 'r',  encoding='utf-8') as file:
-        data = file.read()
-
-    transcript_source = json.loads(data)
-
     # pull out the transcript text and put it in the txt variable
-    txt = transcript_source["results"]["transcripts"][0]["transcript"]
-
-    # set up the Amazon Translate client
-    translate = boto3.client(service_name='translate',
-                             region_name=region, use_ssl=True)
+    txt = load_transcript(transcript).text
 
     # call Translate  with the text, source language code,
     # and target language code.  The result is a JSON structure containing the
-    # translated text
-    translation = translate.translate_text(
-        Text=txt, SourceLanguageCode=source_lang_code, TargetLanguageCode=target_lang_code)
+    # translated text and the (source start, source end, target start, target end)
+    # offsets of the chunks it was translated in
+    translated_txt, chunks = translate_chunked(txt, source_lang_code, target_lang_code, region)
+
+    return {"TranslatedText": translated_txt,
+            "SourceLanguageCode": source_lang_code,
+            "TargetLanguageCode": target_lang_code,
+            "Chunks": chunks}
 
-    return translation
+
+def translate_text(txt, source_lang_code, target_lang_code, region):
+    """
+    Translate txt with Amazon Translate in concurrent sentence-aligned chunks,
+    going through TRANSLATION_CACHE so that the same text is only ever
+    translated once per language pair
+
+    param: txt: The text to translate.
+    param: source_lang_code: The language code for the original content (e.g. English = "EN").
+    param: target_lang_code: The language code for the translated content (e.g. Spanish = "ES").
+    param: region: The AWS region in which to run the Translation (e.g. "us-east-1").
+    """
+    return translate_chunked(txt, source_lang_code, target_lang_code, region)[0]
 
 
 def write_srt(phrases, filename):
@@ -255,27 +346,13 @@ def write_srt(phrases, filename):
     """
     logging.info("==> Writing phrases to disk...")
 
-    # open the files
-    with codecs.open(filename, "w+", "utf-8") as encoded_file:
-        iteration = 1
-
-        for phrase in phrases:
-
-            # write out the phrase number
-            encoded_file.write(str(iteration) + "\n")
-            iteration += 1
-
-            # write out the start and end time
-            encoded_file.write(phrase["start_time"] +
-                               " --> " + phrase["end_time"] + "\n")
-
-            # write out the full phase.  Use spacing if it is a word, or punctuation without spacing
-            out = get_phrase_text(phrase)
+    # build the whole document and write it at once
+    document = "".join("%d\n%s --> %s\n%s\n\n" % (
+        iteration, phrase["start_time"], phrase["end_time"], get_phrase_text(phrase))
+        for iteration, phrase in enumerate(phrases, 1))
 
-            # write out the srt file
-            encoded_file.write(out + "\n\n")
-
-        encoded_file.close()
+    with open(filename, "w", encoding="utf-8") as encoded_file:
+        encoded_file.write(document)
 
 
 def get_phrase_text(phrase):
@@ -284,20 +361,10 @@ def get_phrase_text(phrase):
 
     param: phrase: the array of JSON tuples containing the words to show up as subtitles
     """
-    length = len(phrase["words"])
-
-    out = ""
-    for i in range(0, length):
-        phrase_based_on_iteration = phrase["words"][i]
-        if re.match('[a-zA-Z0-9]', phrase_based_on_iteration):
-            if i > 0:
-                out += " " + phrase_based_on_iteration
-            else:
-                out += phrase_based_on_iteration
-        else:
-            out += phrase_based_on_iteration
-
-    return out
+    # Use spacing if it is a word, or punctuation without spacing
+    parts = [(" " + word if i > 0 and WORD_START.match(word) else word)
+             for i, word in enumerate(phrase["words"])]
+    return "".join(parts)
 
 
 def annotate(clip, txt, txt_color='white', fontsize=24, font='Space-Mono-Italic-for-Powerline'):
@@ -312,13 +379,29 @@ def annotate(clip, txt, txt_color='white', fontsize=24, font='Space-Mono-Italic-
     param: font_size: The size of the font to display. (optional)
     param: font: The font to use for the text. (optional)
     """
+    from moviepy.video.VideoClip import ImageClip
+    from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+
     # Writes a text at the bottom of the clip  'Xolonium-Bold'
-    txtclip = editor.TextClip(
-        txt, fontsize=fontsize, font=font, color=txt_color).on_color(color=[0, 0, 0])
-    cvc = editor.CompositeVideoClip([clip, txtclip.set_pos(('center', 50))])
+    txtclip = ImageClip(render_subtitle(txt, txt_color, fontsize, font)[:, :, :3])
+    cvc = CompositeVideoClip([clip, txtclip.set_pos(('center', 50))])
     return cvc.set_duration(clip.duration)
 
 
+def render_subtitle(txt, txt_color='white', fontsize=24, font='Space-Mono-Italic-for-Powerline'):
+    """
+    Render a subtitle the same way annotate does (text on a black box)
+    and return it as an RGBA image array, ready to be blended on frames.
+    Bitmaps are memoized in TEXT_CACHE, so repeated lines are rasterized once.
+
+    param: txt: The block of text to render.
+    param: txt_color: The color of the text on the screen. (optional)
+    param: font_size: The size of the font to display. (optional)
+    param: font: The font to use for the text. (optional)
+    """
+    return TEXT_CACHE.render(txt, font, fontsize, txt_color, background=(0, 0, 0))
+
+
 def get_current_time():
     """
     This function returns the current time in seconds
@@ -326,11 +409,15 @@ def get_current_time():
     return strftime("%H:%M:%S", gmtime())
 
 
+@METRICS.measure('create_video')
 def create_video(original_clip_name,
                  subtitles_file_name,
                  output_file_name,
                  alternate_audio_file_name,
-                 use_original_audio=True):
+                 use_original_audio=True,
+                 encoder_profile=None,
+                 backend=None,
+                 draft=False):
     """
     This function drives the MoviePy code needed to put
     all of the pieces together and create a new subtitled video
@@ -344,62 +431,267 @@ def create_video(original_clip_name,
                                 that should be used to replace the audio track
     param: use_original_audio: boolean value as to whether or not we should 
                                 leave the orignal audio in place or overlay it
+    param: encoder_profile: name of the encoder profile to write the video
+                                with (default: ENCODER_PROFILE)
+    param: backend: "moviepy" to composite the frames in Python, or "ffmpeg"
+                                to burn the subtitles with libass in a single
+                                ffmpeg run (default: RENDER_BACKEND)
+    param: draft: write a small proxy for review instead: decoded at
+                                DRAFT_HEIGHT and DRAFT_FPS at most, with the
+                                subtitles scaled to match, and encoded with
+                                DRAFT_PROFILE
 
     """
     logging.info("\n==> createVideo ")
 
-    # Load the original clip
+    # MoviePy is only imported by the stages that render
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    size = fps = None
+    scale = 1.0
+    if draft:
+        infos = ffmpeg_parse_infos(original_clip_name)
+        size = draft_size(infos['video_size'])
+        fps = min(get_draft_fps(), infos['video_fps'])
+        scale = size[1] / infos['video_size'][1]
+        encoder_profile = DRAFT_PROFILE
+        logging.info("\t\t==> Draft: %dx%d at %g fps" % (size + (fps,)))
+
+    backend = backend or os.getenv('RENDER_BACKEND', 'moviepy')
+    if backend == 'ffmpeg':
+        logging.info(f"\t %s Rendering with ffmpeg: %s " %
+                     (get_current_time(), output_file_name))
+        frames = render_burned_subtitles(original_clip_name, subtitles_file_name,
+                                         output_file_name, alternate_audio_file_name,
+                                         use_original_audio, get_encoder_profile(encoder_profile),
+                                         size=size, fps=fps)
+        METRICS.count('frames', frames)
+        return
+
+    # Load the original clip, scaled down by the decoder for a draft
     logging.info(f"\t %s Reading video clip: %s " %
                  (get_current_time(), original_clip_name))
 
-    clip = VideoFileClip(original_clip_name)
+    clip = VideoFileClip(original_clip_name,
+                         target_resolution=size and (size[1], size[0]))
+    if fps is not None:
+        clip = clip.set_fps(fps)
 
     logging.info("\t\t==> Original clip duration: " + str(clip.duration))
+    piped_audio = None
     if use_original_audio is False:
         logging.info(f"\t %s Reading alternate audio track: %s " %
                      (get_current_time(), alternate_audio_file_name))
-        audio = AudioFileClip(alternate_audio_file_name)
-        audio = audio.subclip(0, clip.duration)
-        audio.set_duration(clip.duration)
-        logging.info("\t\t==> Audio duration: " + str(audio.duration))
-        clip = clip.set_audio(audio)
+        audio_duration = get_audio_duration(alternate_audio_file_name)
+        logging.info("\t\t==> Audio duration: " + str(audio_duration))
+        if audio_duration < clip.duration:
+            logging.warning("\t\t==> Audio track is shorter than the video")
+        if PCM_TRACKS.get(alternate_audio_file_name) is not None:
+            # a track kept in memory is piped to the encoder, see below
+            piped_audio = alternate_audio_file_name
+            clip = clip.without_audio()
+        else:
+            audio = AudioFileClip(alternate_audio_file_name)
+            audio = audio.subclip(0, min(clip.duration, audio.duration))
+            clip = clip.set_audio(audio)
     else:
         logging.info(f"\t %s Using original audio track... " %
                      (get_current_time()))
 
-    # Create a lambda function that will be used to generate the subtitles for each sequence in the SRT
-    def generator(txt): return TextClip(
-        txt, font='Arial-Bold', fontsize=24, color='white')
-
     # read in the subtitles files
     logging.info(f"\t %s Reading subtitle file: %s " %
                  (get_current_time(), subtitles_file_name))
 
-    subs = SubtitlesClip(subtitles_file_name, generator)
+    index = SubtitleIndex.from_srt(subtitles_file_name, clip.duration - .001)
 
-    logging.info("\t\t==> Subtitles duration before: " + str(subs.duration))
-    subs = subs.subclip(0, clip.duration - .001)
-    subs.set_duration(clip.duration - .001)
-    logging.info("\t\t==> Subtitles duration after: " + str(subs.duration))
+    logging.info("\t\t==> Subtitles entries: " + str(len(index)))
     logging.info(f"\t %s Reading subtitle file complete: %s " %
                  (get_current_time(), subtitles_file_name))
 
-    logging.info(f"\t %s Creating Subtitles Track... " %
-                 (get_current_time()))
-
-    annotated_clips = [annotate(clip.subclip(from_t, to_t), txt)
-                       for (from_t, to_t), txt in subs]
-
     logging.info(f"\t %s Creating composited video: %s " %
                  (get_current_time(), output_file_name))
 
-    # Overlay the text clip on the first video clip
-    final = concatenate_videoclips(annotated_clips)
+    # Draw the active subtitle on each frame in a single pass over the source
+    final = composite_subtitles(
+        clip, index, lambda txt: render_subtitle(txt, fontsize=round(24 * scale)),
+        pos=('center', round(50 * scale)))
 
     logging.info(f"\t %s Writing video file: %s " %
                  (get_current_time(), output_file_name))
 
-    final.write_videofile(output_file_name)
+    profile = get_encoder_profile(encoder_profile)
+    logging.info("\t\t==> Encoder profile: " + profile['name'])
+    params = write_videofile_params(profile)
+    with PCM_TRACKS.wav_pipe(piped_audio, final.duration) as pipe:
+        if pipe is not None:
+            # MoviePy copies an audio file as-is, the PCM is encoded instead
+            params['audio'] = pipe
+            params['ffmpeg_params'] = params['ffmpeg_params'] + audio_encoder_params(profile)
+        final.write_videofile(output_file_name, **params)
+    METRICS.count('frames', int(final.duration * final.fps))
+    TEXT_CACHE.log_stats()
+
+
+@METRICS.measure('create_video_segmented')
+def create_video_segmented(original_clip_name,
+                           subtitles_file_name,
+                           output_file_name,
+                           alternate_audio_file_name,
+                           use_original_audio=True,
+                           encoder_profile=None,
+                           segment_seconds=None,
+                           workers=None):
+    """
+    Render the same video as create_video, but split the source into
+    keyframe-aligned segments rendered by create_video in a pool of worker
+    processes, then join them with a stream copy and mux the audio of the
+    whole video back in.
+
+    param: original_clip_name:  the filename of the original content (e.g. "originalVideo.mp4")
+    param: subtitles_file_name: the filename of the SRT file (e.g. "mySRT.srt")
+    param: output_file_name: the filename of the output video file
+    param: alternate_audio_file_name: the filename of an MP3 file
+                                that should be used to replace the audio track
+    param: use_original_audio: whether to keep the original audio track
+    param: encoder_profile: name of the encoder profile to write the video
+                                with (default: ENCODER_PROFILE)
+    param: segment_seconds: target length of a segment (default: SEGMENT_SECONDS)
+    param: workers: number of segments rendered at the same time (default: SEGMENT_WORKERS)
+    """
+    logging.info("\n==> createVideoSegmented ")
+
+    segment_seconds = segment_seconds or get_segment_seconds()
+    workers = workers or get_segment_workers()
+    profile = get_encoder_profile(encoder_profile)
+
+    with tempfile.TemporaryDirectory(prefix="segments-", dir=".") as directory:
+        segments = split_video(original_clip_name, segment_seconds, directory)
+        if len(segments) <= 1:
+            logging.info("\t\t==> Single segment, rendering the whole timeline")
+            create_video(original_clip_name, subtitles_file_name, output_file_name,
+                         alternate_audio_file_name, use_original_audio, encoder_profile)
+            return
+
+        srt_file_names = split_srt(subtitles_file_name, segments, directory)
+        rendered = [os.path.join(directory, "rendered-%05d.mp4" % n)
+                    for n in range(len(segments))]
+
+        logging.info(f"\t %s Rendering %d segments with %d workers " %
+                     (get_current_time(), len(segments), workers))
+        with process_pool(workers) as executor:
+            futures = [executor.submit(collect, create_video, segment_file_name,
+                                       srt_file_name, rendered_file_name, None, True,
+                                       profile['name'])
+                       for (segment_file_name, _, _), srt_file_name, rendered_file_name
+                       in zip(segments, srt_file_names, rendered)]
+            for future in futures:
+                METRICS.merge(future.result()[1])
+
+        logging.info(f"\t %s Joining segments: %s " %
+                     (get_current_time(), output_file_name))
+        joined_file_name = os.path.join(directory, "joined.mp4")
+        concat_segments(rendered, joined_file_name, directory)
+        if use_original_audio:
+            mux_audio(joined_file_name, original_clip_name, output_file_name, profile,
+                      copy=True)
+        else:
+            mux_audio(joined_file_name, alternate_audio_file_name, output_file_name, profile)
+
+
+def render_video(*args, **kwargs):
+    """
+    Call create_video_segmented when SEGMENT_SECONDS is set, create_video otherwise
+    """
+    if get_segment_seconds() > 0:
+        return create_video_segmented(*args, **kwargs)
+    return create_video(*args, **kwargs)
+
+
+@METRICS.measure('create_videos')
+def create_videos(original_clip_name, outputs, encoder_profile=None):
+    """
+    Render several subtitled variants of the same video while decoding the
+    source only once: every frame is read a single time, then composited
+    with each output's subtitles and handed to that output's encoder.
+
+    param: original_clip_name:  the filename of the original content (e.g. "originalVideo.mp4")
+    param: outputs: list of (subtitles_file_name, output_file_name,
+                                alternate_audio_file_name, use_original_audio) tuples,
+                                with the same meaning as the create_video parameters
+    param: encoder_profile: name of the encoder profile to write the videos
+                                with (default: ENCODER_PROFILE)
+    """
+    logging.info("\n==> createVideos ")
+
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+    logging.info(f"\t %s Reading video clip: %s " %
+                 (get_current_time(), original_clip_name))
+    clip = VideoFileClip(original_clip_name)
+    logging.info("\t\t==> Original clip duration: " + str(clip.duration))
+
+    profile = get_encoder_profile(encoder_profile)
+    logging.info("\t\t==> Encoder profile: " + profile['name'])
+    audio_params, audio_ext = audio_file_params(profile)
+
+    blenders = []
+    writers = []
+    audio_files = []
+    with ExitStack() as pipes:
+        try:
+            for (subtitles_file_name, output_file_name,
+                 alternate_audio_file_name, use_original_audio) in outputs:
+                logging.info(f"\t %s Preparing output: %s " %
+                             (get_current_time(), output_file_name))
+
+                params = video_writer_params(profile)
+                audio = audio_file = None
+                if use_original_audio is False:
+                    if get_audio_duration(alternate_audio_file_name) < clip.duration:
+                        logging.warning("\t\t==> Audio track is shorter than the video")
+                    if PCM_TRACKS.get(alternate_audio_file_name) is not None:
+                        # a track kept in memory is piped to the encoder
+                        audio_file = pipes.enter_context(
+                            PCM_TRACKS.wav_pipe(alternate_audio_file_name, clip.duration))
+                        params['ffmpeg_params'] = (params['ffmpeg_params'] +
+                                                   audio_encoder_params(profile))
+                    else:
+                        audio = AudioFileClip(alternate_audio_file_name)
+                        audio = audio.subclip(0, min(clip.duration, audio.duration))
+                else:
+                    audio = clip.audio
+
+                if audio is not None:
+                    audio_file = (os.path.splitext(output_file_name)[0] +
+                                  "TEMP_wvf_snd." + audio_ext)
+                    audio.write_audiofile(audio_file, 44100, **audio_params)
+                    audio_files.append(audio_file)
+
+                index = SubtitleIndex.from_srt(subtitles_file_name, clip.duration - .001)
+                blenders.append(make_subtitle_blender(clip.size, index, render_subtitle))
+                writers.append(FFMPEG_VideoWriter(output_file_name, clip.size, clip.fps,
+                                                  audiofile=audio_file, **params))
+
+            logging.info(f"\t %s Writing %d video files in one pass " %
+                         (get_current_time(), len(writers)))
+
+            for t, frame in clip.iter_frames(with_times=True, dtype="uint8"):
+                for blend, writer in zip(blenders, writers):
+                    writer.write_frame(blend(frame, t))
+                METRICS.count('frames', len(writers))
+        finally:
+            for writer in writers:
+                writer.close()
+            for audio_file in audio_files:
+                if os.path.exists(audio_file):
+                    os.remove(audio_file)
+            clip.close()
+
+    TEXT_CACHE.log_stats()
 
 
 def write_audio(output_file, stream):
@@ -423,14 +715,15 @@ def write_audio(output_file, stream):
     If the file already exists, it will be overwritten.
     """
 
-    my_bytes = stream.read()
-
-    logging.info("\t==> Writing " + str(len(my_bytes)) +
-                 "bytes to audio file: " + output_file)
+    logging.info("\t==> Writing audio file: " + output_file)
     try:
-        # Open a file for writing the output as a binary stream
+        # Open a file for writing the output as a binary stream, copied chunk by chunk
         with open(output_file, "wb") as file:
-            file.write(my_bytes)
+            size = 0
+            for chunk in iter(lambda: stream.read(STREAM_CHUNK_BYTES), b""):
+                file.write(chunk)
+                size += len(chunk)
+        logging.info("\t==> Wrote " + str(size) + " bytes")
 
         if file.closed:
             logging.info("\t==>" + output_file + " is closed")
@@ -442,17 +735,21 @@ def write_audio(output_file, stream):
         sys.exit(-1)
 
 
+@METRICS.measure('synthesis')
 def create_audio_track_from_translation(transcript, source_lang_code,
                                         target_lang_code, audio_file_name, region):
     """
     Using the provided transcript, get a translation from Amazon Translate, 
-    then use Amazon Polly to synthesize speech
+    then use Amazon Polly to synthesize speech. Long translations are split on
+    sentence boundaries, synthesized concurrently and stitched back in order.
 
-    :param transcript: the Amazon Transcribe JSON structure to translate
+    :param transcript: the Transcript (or the Amazon Transcribe JSON file) to translate
     :param source_lang_code: the language code for the original content (e.g. English = "EN")
     :param target_lang_code: the language code for the translated content (e.g. Spanich = "ES")
     :param audio_file_name: the name (including extension) of the target audio file (e.g. "abc.mp3")
     :param region: the aws region in which to run the service
+    :return: the duration in seconds of every synthesized chunk, or None if
+             the synthesis failed
 
     Example:
     >>> create_audio_track_from_translation(transcript, "EN", "ES", "abc.mp3", "us-east-1")
@@ -469,54 +766,66 @@ def create_audio_track_from_translation(transcript, source_lang_code,
     """
     logging.info("\n==> create_audio_track_from_translation ")
 
-    # Set up the polly and translate services
-    client = boto3.client('polly', region_name=region)
-    translate = boto3.client(service_name='translate',
-                             region_name=region, use_ssl=True)
-
     # get the transcript text
-    with open(transcript, 'r', encoding='utf-8') as file:
-        data = file.read()
-    temp = json.loads(data)
-    transcript_txt = temp["results"]["transcripts"][0]["transcript"]
-
-    voice_id = get_voice_id(target_lang_code)
+    transcript_txt = load_transcript(transcript).text
 
-    # Now translate it.
-    translated_txt = translate.translate_text(Text=transcript_txt,
-                                              SourceLanguageCode=source_lang_code,
-                                              TargetLanguageCode=target_lang_code
-                                              )["TranslatedText"][:2999]
+    # Now translate it, the translation done for the subtitles is reused from the cache
+    translated_txt = translate_text(transcript_txt, source_lang_code,
+                                    target_lang_code, region)
 
     # Use the translated text to create the synthesized speech
-    response = client.synthesize_speech(
-        OutputFormat="mp3", SampleRate="22050", Text=translated_txt, VoiceId=voice_id)
+    chunks = synthesize_speech_chunks(translated_txt, target_lang_code, region)
 
-    if response["ResponseMetadata"]["HTTPStatusCode"] == 200:
-        logging.info("\t==> Successfully called Polly for speech synthesis")
-        write_audio_stream(response, audio_file_name)
-    else:
+    if chunks is None:
         logging.info("\t==> Error calling Polly for speech synthesis")
+        return None
 
+    logging.info("\t==> Successfully called Polly for speech synthesis")
+    if get_audio_format() == 'pcm':
+        # raw PCM chunks concatenate as-is, and the track stays in memory
+        PCM_TRACKS.put(audio_file_name, b"".join(chunks))
+        return [len(chunk) / 2 / PCM_SAMPLE_RATE for chunk in chunks]
+    write_audio(audio_file_name, io.BytesIO(
+        b"".join(audio_frames(chunk) for chunk in chunks)))
+    return [mp3_duration(io.BytesIO(chunk)) for chunk in chunks]
 
-def write_audio_stream(response, audio_file_name):
-    """
-    Utility to write an audio file from the response from the Amazon Polly API
 
-    :param response: the Amazaon Polly JSON response
-    :param audio_file_name: the name (including extension) of the target audio file (e.g. "abc.mp3")
+def synthesize_speech_chunks(text, target_lang_code, region):
+    """
+    Synthesize text with Amazon Polly in sentence-aligned chunks under the
+    request limit, with at most POLLY_CONCURRENCY requests in flight
 
-    Example:
-    >>> response = client.synthesize_speech(
-    ...     OutputFormat="mp3", SampleRate="22050", Text="Hello World", voice_id="Aditi")
-    >>> write_audio_stream(response, "abc.mp3")
+    :param text: the text to synthesize
+    :param target_lang_code: the language code used for the target Amazon Polly output
+    :param region: the aws region in which to run the service
+    :return: the MP3 or, with AUDIO_FORMAT=pcm, PCM bytes of every chunk, in
+             text order, or None if a request failed
     """
+    # Set up the polly service, the client is shared by the threads
+    client = get_client('polly', region)
+    voice_id = get_voice_id(target_lang_code)
+    if get_audio_format() == 'pcm':
+        output = {'OutputFormat': "pcm", 'SampleRate': str(PCM_SAMPLE_RATE)}
+    else:
+        output = {'OutputFormat': "mp3", 'SampleRate': "22050"}
 
-    # Take the resulting stream and write it to an mp3 file
-    if "AudioStream" in response:
+    def synthesize(span):
+        response = client.synthesize_speech(
+            Text=text[span[0]:span[1]], VoiceId=voice_id, **output)
+        if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
+            return None
         with closing(response["AudioStream"]) as stream:
-            output = audio_file_name
-            write_audio(output, stream)
+            return read_stream(stream)
+
+    spans = chunk_text(text, POLLY_MAX_CHARS)
+    logging.info("\t==> Synthesizing %d chunks" % len(spans))
+
+    with ThreadPoolExecutor(max_workers=get_polly_concurrency()) as executor:
+        chunks = list(executor.map(synthesize, spans))
+
+    if any(chunk is None for chunk in chunks):
+        return None
+    return chunks
 
 
 def get_voice_id(target_lang_code):
@@ -560,81 +869,32 @@ def get_voice_id(target_lang_code):
     return voice_id
 
 
-def get_seconds_from_translation(text_to_synthesize, target_lang_code, audio_file_name, region):
+def get_audio_duration(audio_file_name):
     """
-    Utility to determine how long in seconds it will 
-    take for a particular phrase of translated text to be spoken
+    Utility to return the duration in seconds of an audio track without
+    decoding it: a track kept in memory, a WAV file or an MP3 file
 
-    :param text_to_synthesize: the raw text to be synthesized
-    :param target_lang_code: the language code used for the target Amazon Polly output
-    :param audio_file_name: the name (including extension) of the target audio file (e.g. "abc.mp3")
+    :param audio_file_name: the name (including extension) of the audio file (e.g. "abc.mp3")
     """
+    duration = PCM_TRACKS.duration(audio_file_name)
+    if duration is not None:
+        return duration
+    if audio_file_name.endswith(".wav"):
+        with wave.open(audio_file_name, "rb") as file:
+            return file.getnframes() / file.getframerate()
+    with open(audio_file_name, "rb") as file:
+        return mp3_duration(file)
 
-    # Set up the polly and translate services
-    client = boto3.client('polly', region_name=region)
-    boto3.client(service_name='translate',
-                 region_name=region, use_ssl=True)
 
-    # Use the translated text to create the synthesized speech
-    response = client.synthesize_speech(
-        OutputFormat="mp3", SampleRate="22050",
-        Text=text_to_synthesize, VoiceId=get_voice_id(target_lang_code))
-
-    # write the stream out to disk so that we can load it into an AudioClip
-    write_audio_stream(response, audio_file_name)
-
-    # Load the temporary audio clip into an AudioFileClip
-    audio = AudioFileClip(audio_file_name)
-
-    # return the duration
-    return audio.duration
-
-
-def download_file_from_s3(input_file_name, output_file_name):
-    """Upload a file to an S3 bucket
-
-    :param input_file_name: input file in format s3://
-    :param output_file_name: S3 object name after download
-    :return: True if file was uploaded, else False
+def audio_track_name(lang):
     """
-    if not input_file_name.startswith('s3://'):
-        logging.error("Wrong input filename")
-        return False
-
-    # Remove the 's3://' prefix
-    path_without_prefix = input_file_name[5:]
-    # Split the path into bucket and object parts
-    bucket_name, object_name = path_without_prefix.split('/', 1)
-    s3_client = boto3.client('s3')
-    try:
-        s3_client.download_file(bucket_name, object_name, output_file_name)
-    except ClientError as local_error:
-        logging.error(local_error)
-        return False
-    return True
-
-
-def upload_file_to_s3(file_name, bucket, object_name=None):
-    """Upload a file to an S3 bucket
+    Return the file name of the synthesized audio track of a language: an
+    MP3 file, or with AUDIO_FORMAT=pcm the name of a track kept in memory,
+    written as a WAV file only when a file is needed
 
-    :param file_name: File to upload
-    :param bucket: Bucket to upload to
-    :param object_name: S3 object name. If not specified then file_name is used
-    :return: True if file was uploaded, else False
+    :param lang: the language code (e.g. "es")
     """
-
-    # If S3 object_name was not specified, use file_name
-    if object_name is None:
-        object_name = os.path.basename(file_name)
-
-    # Upload the file
-    s3_client = boto3.client('s3')
-    try:
-        s3_client.upload_file(file_name, bucket, object_name)
-    except ClientError as local_error:
-        logging.error(local_error)
-        return False
-    return True
+    return "audio-" + lang + (".wav" if get_audio_format() == 'pcm' else ".mp3")
 
 
 def parse_infile_to_outfile(infile, used_language):
@@ -659,34 +919,409 @@ def parse_infile_to_outfile(infile, used_language):
     return desired_word + "-" + used_language + ".mp4"
 
 
+def prepare_language(transcript, lang, region, checkpoints):
+    """ Write the translated subtitles and the synthesized audio track for one
+    language, or restore them from the checkpoints of an earlier run
+
+    :param transcript: the Transcript loaded from the Amazon Transcribe output
+    :param lang: the target language code (e.g. "es")
+    :param region: the aws region in which to run the services
+    :param checkpoints: the Checkpoints of the job
+    """
+    with METRICS.language(lang):
+        subtitles_restored = checkpoints.restore("subtitles-" + lang + ".srt")
+
+        # The audio track comes first, the subtitles are timed on its chunks,
+        # so new subtitles always go with a new track
+        chunk_durations = None
+        if not subtitles_restored or not checkpoints.restore(audio_track_name(lang)):
+            chunk_durations = create_audio_track_from_translation(
+                transcript, 'en', lang, audio_track_name(lang), region)
+            if checkpoints.store is not None:
+                # a track kept in memory is only written out to be checkpointed
+                PCM_TRACKS.materialize(audio_track_name(lang))
+                checkpoints.save(audio_track_name(lang))
+
+        if not subtitles_restored:
+            write_translation_to_srt(transcript, 'en', lang,
+                                     "subtitles-" + lang + ".srt", region, chunk_durations)
+            checkpoints.save("subtitles-" + lang + ".srt")
+
+
+def process_language(transcript, lang, region, checkpoints):
+    """ Translate, synthesize and render the video for one target language
+
+    :param transcript: the Transcript loaded from the Amazon Transcribe output
+    :param lang: the target language code (e.g. "es")
+    :param region: the aws region in which to run the services
+    :param checkpoints: the Checkpoints of the job
+    :return: the file name of the rendered video
+    """
+    prepare_language(transcript, lang, region, checkpoints)
+
+    # Finally, create the composited video
+    with METRICS.language(lang):
+        if not checkpoints.restore("video-" + lang + ".mp4"):
+            render_video("video.mp4", "subtitles-" + lang + ".srt",
+                         "video-" + lang + ".mp4", audio_track_name(lang), False)
+            checkpoints.save("video-" + lang + ".mp4")
+    return "video-" + lang + ".mp4"
+
+
+def upload_output(file_name, outbucket, invideo, lang, transfers, checkpoints,
+                  metrics_lang=None):
+    """ Upload the final video of a language in the background and record the
+    upload in the checkpoints once it succeeded
+
+    :param file_name: the rendered video
+    :param outbucket: the bucket the video is uploaded to
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param lang: the language of the video, which names the uploaded object
+    :param transfers: the BackgroundTransfers the upload is queued on
+    :param checkpoints: the Checkpoints of the job
+    :param metrics_lang: the language record the upload is measured in (default: lang)
+    """
+    object_name = parse_infile_to_outfile(invideo, lang)
+
+    def record(future):
+        if future.exception() is None and future.result():
+            checkpoints.mark_done("upload/" + object_name)
+
+    with METRICS.language(metrics_lang or lang):
+        transfers.upload(file_name, outbucket, object_name).add_done_callback(record)
+
+
+def process_languages(transcript, languages, invideo, outbucket, region, transfers,
+                      checkpoints, workers=1):
+    """ Run process_language for every language, in a pool of worker processes
+    when workers > 1. Each rendered video is uploaded in the background while
+    the next languages render. A failing language is logged and does not stop
+    the others.
+
+    :param transcript: the Transcript loaded from the Amazon Transcribe output
+    :param languages: list of target language codes
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param outbucket: the bucket the final videos are uploaded to
+    :param region: the aws region in which to run the services
+    :param transfers: the BackgroundTransfers the uploads are queued on
+    :param checkpoints: the Checkpoints of the job
+    :param workers: number of languages rendered at the same time
+    :return: list of the languages that failed to render
+    """
+    failed = []
+
+    if workers <= 1:
+        for lang in languages:
+            try:
+                output_file_name = process_language(transcript, lang, region, checkpoints)
+            except Exception:
+                logging.exception("==> Processing language %s failed", lang)
+                failed.append(lang)
+                continue
+            upload_output(output_file_name, outbucket, invideo, lang, transfers, checkpoints)
+        return failed
+
+    logging.info("==> Processing %d languages with %d workers",
+                 len(languages), workers)
+    with process_pool(workers) as executor:
+        futures = {executor.submit(collect, process_language, transcript, lang, region,
+                                   checkpoints): lang
+                   for lang in languages}
+        for future in as_completed(futures):
+            lang = futures[future]
+            try:
+                output_file_name, stages = future.result()
+            except Exception:
+                logging.exception("==> Processing language %s failed", lang)
+                failed.append(lang)
+                continue
+            METRICS.merge(stages)
+            upload_output(output_file_name, outbucket, invideo, lang, transfers, checkpoints)
+    return failed
+
+
+def process_languages_decode_once(transcript, languages, invideo, outbucket, region,
+                                  transfers, checkpoints):
+    """ Prepare every language, then render the English and all translated
+    videos from a single decoding pass over the source with create_videos.
+
+    :param transcript: the Transcript loaded from the Amazon Transcribe output
+    :param languages: list of target language codes
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param outbucket: the bucket the final videos are uploaded to
+    :param region: the aws region in which to run the services
+    :param transfers: the BackgroundTransfers the uploads are queued on
+    :param checkpoints: the Checkpoints of the job
+    :return: list of the languages that failed to render
+    """
+    failed = []
+    prepared = []
+    for lang in languages:
+        try:
+            prepare_language(transcript, lang, region, checkpoints)
+            prepared.append(lang)
+        except Exception:
+            logging.exception("==> Processing language %s failed", lang)
+            failed.append(lang)
+
+    outputs = [("subtitles-en.srt", "result-en.mp4", audio_track_name('en'), True)]
+    outputs += [("subtitles-" + lang + ".srt", "video-" + lang + ".mp4",
+                 audio_track_name(lang), False) for lang in prepared]
+    # Only decode the source for the videos no earlier run rendered
+    outputs = [output for output in outputs if not checkpoints.restore(output[1])]
+    if outputs:
+        create_videos("video.mp4", outputs)
+    for output in outputs:
+        checkpoints.save(output[1])
+
+    for lang in prepared:
+        upload_output("video-" + lang + ".mp4", outbucket, invideo, lang,
+                      transfers, checkpoints)
+    return failed
+
+
+def process_languages_soft(transcript, languages, invideo, outbucket, region, transfers,
+                           checkpoints):
+    """ Prepare every language, then remux all the subtitles as selectable tracks
+    and the dubbed audio as extra audio tracks into one MP4, without re-encoding
+    the video.
+
+    :param transcript: the Transcript loaded from the Amazon Transcribe output
+    :param languages: list of target language codes
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param outbucket: the bucket the final video is uploaded to
+    :param region: the aws region in which to run the services
+    :param transfers: the BackgroundTransfers the upload is queued on
+    :param checkpoints: the Checkpoints of the job
+    :return: list of the languages that failed
+    """
+    failed = []
+    prepared = []
+    for lang in languages:
+        try:
+            prepare_language(transcript, lang, region, checkpoints)
+            prepared.append(lang)
+        except Exception:
+            logging.exception("==> Processing language %s failed", lang)
+            failed.append(lang)
+
+    subtitle_tracks = [('en', "subtitles-en.srt")]
+    subtitle_tracks += [(lang, "subtitles-" + lang + ".srt") for lang in prepared]
+    audio_tracks = [(lang, audio_track_name(lang)) for lang in prepared]
+    for _, file_name in audio_tracks:
+        PCM_TRACKS.materialize(file_name)
+
+    logging.info(f"\t %s Remuxing %d subtitle tracks " %
+                 (get_current_time(), len(subtitle_tracks)))
+    with METRICS.stage('remux', lang='multi'):
+        remux_soft_subtitles("video.mp4", subtitle_tracks, "video-multi.mp4", audio_tracks)
+    upload_output("video-multi.mp4", outbucket, invideo, "multi", transfers, checkpoints)
+    return failed
+
+
+def process_languages_draft(transcript, languages, invideo, outbucket, region, transfers,
+                            checkpoints):
+    """ Render a small draft of the English video and of every translated one
+    with create_video(draft=True), so the transcript can be reviewed before
+    the full quality render. The drafts are uploaded as <video>-draft-<lang>.mp4.
+
+    :param transcript: the Transcript loaded from the Amazon Transcribe output
+    :param languages: list of target language codes
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param outbucket: the bucket the drafts are uploaded to
+    :param region: the aws region in which to run the services
+    :param transfers: the BackgroundTransfers the uploads are queued on
+    :param checkpoints: the Checkpoints of the job
+    :return: list of the languages that failed to render
+    """
+    failed = []
+    for lang in ['en'] + languages:
+        try:
+            if lang != 'en':
+                prepare_language(transcript, lang, region, checkpoints)
+            with METRICS.language(lang):
+                if not checkpoints.restore("draft-" + lang + ".mp4"):
+                    create_video("video.mp4", "subtitles-" + lang + ".srt",
+                                 "draft-" + lang + ".mp4", audio_track_name(lang),
+                                 lang == 'en', draft=True)
+                    checkpoints.save("draft-" + lang + ".mp4")
+        except Exception:
+            logging.exception("==> Processing language %s failed", lang)
+            failed.append(lang)
+            continue
+        # measured with the draft render of the language
+        upload_output("draft-" + lang + ".mp4", outbucket, invideo, "draft-" + lang,
+                      transfers, checkpoints, metrics_lang=lang)
+    return failed
+
+
+def prepare_shared(invideo, insubtitles):
+    """ Prepare stage of a job split into AWS Batch array children, one per
+    language: parse the transcript and write the English subtitles once, and
+    publish them with the transcript to SHARED_URI for the children
+
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param insubtitles: the Amazon Transcribe output in format s3://path/to/file.json
+    :return: True once the intermediates are published
+    """
+    shared = shared_from_env(invideo, insubtitles)
+    if all(shared.done(name) for name in SHARED_FILES):
+        logging.info("==> Shared intermediates already published")
+        return True
+
+    if not download_file_from_s3(insubtitles, "transcribe.json"):
+        return False
+    transcript = Transcript.load("transcribe.json")
+    transcript.save("transcript.pickle")
+    write_transcript_to_srt(transcript, "subtitles-en.srt")
+    for name in SHARED_FILES:
+        shared.save(name)
+    return True
+
+
+def restore_shared(invideo, insubtitles):
+    """ Restore the intermediates published by prepare_shared into the
+    working directory of an array child
+
+    :param invideo: the source video in format s3://path/to/file.mp4
+    :param insubtitles: the Amazon Transcribe output in format s3://path/to/file.json
+    :return: the parsed Transcript, or None if the intermediates are missing
+    """
+    shared = shared_from_env(invideo, insubtitles)
+    if not all(shared.restore(name) for name in SHARED_FILES):
+        logging.warning("==> Shared intermediates missing, preparing them in this job")
+        return None
+    return Transcript.load_parsed("transcript.pickle")
+
+
 # ==================================================================================
 # Main control loop
 # ==================================================================================
 
-INVIDEO = os.getenv('INVIDEO')
-INSUBTITLES = os.getenv('INSUBTITLES')
-OUTBUCKET = os.getenv('OUTBUCKET')
-OUTLANG = os.getenv('OUTLANG')
-REGION = os.getenv('REGION')
+def run_job():
+    """
+    Run the job configured by the environment: download the video and the
+    transcript, then render and upload the video of every language
 
-download_file_from_s3(INVIDEO, "video.mp4")
-download_file_from_s3(INSUBTITLES, "transcribe.json")
-write_transcript_to_srt("transcribe.json", "subtitles-en.srt")
-create_video('video.mp4', "subtitles-en.srt",
-             "result-en.mp4",
-             "audio-en.mp3", True)
+    As an AWS Batch array job, JOB_STAGE=prepare runs prepare_shared, and
+    every array child renders the language of OUTLANG at its
+    AWS_BATCH_JOB_ARRAY_INDEX from the shared intermediates.
 
-# Now write out the translation to the transcript for each of the target languages
-for lang in OUTLANG.split():
-    write_translation_to_srt("transcribe.json", 'en', lang,
-                             "subtitles-" + lang + ".srt", REGION)
+    :return: True if every language was rendered and uploaded
+    """
+    invideo = os.getenv('INVIDEO')
+    insubtitles = os.getenv('INSUBTITLES')
+    outbucket = os.getenv('OUTBUCKET')
+    outlang = os.getenv('OUTLANG')
+    region = os.getenv('REGION')
+    parallel_langs = int(os.getenv('PARALLEL_LANGS', '1'))
+    decode_once = os.getenv('DECODE_ONCE', '') == '1'
+    subtitle_mode = os.getenv('SUBTITLE_MODE', 'burn')
+    draft = os.getenv('DRAFT', '') == '1'
+    array_index = os.getenv('AWS_BATCH_JOB_ARRAY_INDEX')
+
+    if os.getenv('JOB_STAGE') == 'prepare':
+        return prepare_shared(invideo, insubtitles)
+
+    transcript = None
+    if array_index is not None:
+        if draft or subtitle_mode == 'soft':
+            raise ValueError("DRAFT and SUBTITLE_MODE=soft need every language in one job")
+        outlang = outlang.split()[int(array_index)]
+        logging.info("==> Array child %s: %s" % (array_index, outlang))
+        transcript = restore_shared(invideo, insubtitles)
+
+    transfers = BackgroundTransfers()
+    transcript_download = video_download = None
+    if transcript is None:
+        transcript_download = transfers.download(insubtitles, "transcribe.json")
+    # With checkpoints the small transcript comes first: with the video ETag it
+    # keys the checkpoints, which may show the video is not needed at all
+    if not os.getenv('CHECKPOINT_URI'):
+        video_download = transfers.download(invideo, "video.mp4")
+
+    if transcript_download is not None and not transcript_download.result():
+        logging.error("==> Could not download the transcript " + insubtitles)
+        transfers.wait()
+        return False
+    checkpoints = checkpoints_from_env(invideo, "transcribe.json")
+
+    # Languages whose final video an earlier run already uploaded are skipped
+    if draft:
+        pending_langs = [lang for lang in outlang.split() if not checkpoints.done(
+            "upload/" + parse_infile_to_outfile(invideo, "draft-" + lang))]
+    elif subtitle_mode == 'soft':
+        pending_langs = [] if checkpoints.done(
+            "upload/" + parse_infile_to_outfile(invideo, "multi")) else outlang.split()
+    else:
+        pending_langs = [lang for lang in outlang.split() if not checkpoints.done(
+            "upload/" + parse_infile_to_outfile(invideo, lang))]
+
+    if not pending_langs:
+        logging.info("==> Every output was uploaded by an earlier run, nothing to do")
+        METRICS.emit(invideo)
+        return True
+
+    if video_download is None:
+        video_download = transfers.download(invideo, "video.mp4")
+    if transcript is None:
+        transcript = Transcript.load("transcribe.json")
+        write_transcript_to_srt(transcript, "subtitles-en.srt")
+
+    # Translate while the video is still downloading, the later stages read the cache
+    with METRICS.stage('prefetch'), ThreadPoolExecutor(max_workers=4) as prefetch:
+        for lang in pending_langs:
+            prefetch.submit(translate_text, transcript.text, 'en', lang, region)
+        video_downloaded = video_download.result()
+    if not video_downloaded:
+        logging.error("==> Could not download the video " + invideo)
+        transfers.wait()
+        return False
 
-    # Now that we have the subtitle files, let's create the audio track
-    create_audio_track_from_translation(
-        "transcribe.json", 'en', lang, "audio-" + lang + ".mp3", REGION)
+    if draft:
+        failed_langs = process_languages_draft(transcript, pending_langs, invideo, outbucket,
+                                               region, transfers, checkpoints)
+    elif subtitle_mode == 'soft':
+        failed_langs = process_languages_soft(transcript, pending_langs, invideo, outbucket,
+                                              region, transfers, checkpoints)
+    elif decode_once and array_index is None:
+        failed_langs = process_languages_decode_once(transcript, pending_langs, invideo,
+                                                     outbucket, region, transfers, checkpoints)
+    else:
+        # Array children only render their own language
+        if array_index is None:
+            with METRICS.language('en'):
+                if not checkpoints.restore("result-en.mp4"):
+                    render_video('video.mp4', "subtitles-en.srt",
+                                 "result-en.mp4",
+                                 audio_track_name('en'), True)
+                    checkpoints.save("result-en.mp4")
+
+        # Now write out the translation to the transcript for each of the target languages
+        failed_langs = process_languages(transcript, pending_langs, invideo, outbucket,
+                                         region, transfers, checkpoints, parallel_langs)
+
+    # Wait for the uploads still running in the background
+    failed_uploads = transfers.wait()
+    TRANSLATION_CACHE.log_stats()
+    checkpoints.log_stats()
+    METRICS.emit(invideo)
+    if failed_langs or failed_uploads:
+        logging.error("==> Failed languages: " + " ".join(failed_langs) +
+                      ", failed uploads: " + " ".join(failed_uploads))
+        return False
+    return True
 
-    # Finally, create the composited video
-    create_video("video.mp4", "subtitles-" + lang + ".srt",
-                 "video-" + lang + ".mp4", "audio-" + lang + ".mp3", False)
-    upload_file_to_s3("video-" + lang + ".mp4", OUTBUCKET,
-                      parse_infile_to_outfile(INVIDEO, lang))
+
+def main():
+    """
+    Run the single job configured by the environment, exiting with status 1
+    if any language failed
+    """
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    if not run_job():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Stage-level performance metrics of a job, emitted as one structured record
+per language at the end of the job
+"""
+import contextvars
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# language tag inherited by the stages nested in a stage, and by the
+# background transfers started from it (see transfer.BackgroundTransfers)
+_LANGUAGE = contextvars.ContextVar('language', default=None)
+
+
+def read_proc_io():
+    """
+    Return the bytes this process passed through read and write calls, or
+    (0, 0) where /proc/self/io is not available
+    """
+    try:
+        with open('/proc/self/io') as file:
+            fields = dict(line.split(':') for line in file)
+    except OSError:
+        return 0, 0
+    return int(fields['rchar']), int(fields['wchar'])
+
+
+def cpu_seconds():
+    """
+    CPU time of this process and of its finished children, e.g. ffmpeg
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class Metrics:
+    """
+    Records the wall time, CPU time, RSS high-water mark, bytes read and
+    written, frames encoded and AWS API calls of every pipeline stage. Stages
+    nest and inherit the language of the enclosing stage.
+
+    Wall time and frames belong to the stage itself. CPU time, bytes and API
+    calls are the process-wide difference between the start and the end of
+    the stage, since the work of a stage runs on helper threads (S3 transfers,
+    Polly and Translate pools) and in ffmpeg processes. They are exact for a
+    stage that runs alone. When stages overlap, e.g. background uploads or
+    the translation prefetch, each of them also counts the work of the
+    others, so they are an upper bound. The RSS high-water marks are the
+    largest resident memory of the process, and of any of its finished
+    children, since the process started: they show the peak a stage pushed
+    the job to, not the peak of the stage alone.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = []
+        self._api_calls = {}
+        self._counters = threading.local()
+
+    @contextmanager
+    def stage(self, name, lang=None):
+        """
+        Measure the code run in the with block as stage name
+
+        :param name: the name of the stage (e.g. "synthesis")
+        :param lang: the language the stage works on, by default the one of the enclosing stage
+        """
+        token = _LANGUAGE.set(lang or _LANGUAGE.get())
+        counters = getattr(self._counters, 'stack', None)
+        if counters is None:
+            counters = self._counters.stack = []
+        counters.append({})
+
+        api_calls = self.api_calls()
+        bytes_read, bytes_written = read_proc_io()
+        cpu = cpu_seconds()
+        wall = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = cpu_seconds() - cpu
+            end_read, end_written = read_proc_io()
+            record = {
+                'stage': name, 'language': _LANGUAGE.get(),
+                'wall_seconds': wall, 'cpu_seconds': cpu,
+                'rss_high_water_mb':
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                'children_rss_high_water_mb':
+                    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+                'bytes_read': end_read - bytes_read,
+                'bytes_written': end_written - bytes_written,
+                'api_calls': self._api_calls_since(api_calls),
+            }
+            counts = counters.pop()
+            record.update(counts)
+            # counts of a nested stage also belong to the enclosing ones
+            for outer in counters:
+                for counter, value in counts.items():
+                    outer[counter] = outer.get(counter, 0) + value
+            _LANGUAGE.reset(token)
+            with self._lock:
+                self._stages.append(record)
+
+    @contextmanager
+    def language(self, lang):
+        """
+        Tag the stages started in the with block, and the background
+        transfers queued from it, with lang
+
+        :param lang: the language code (e.g. "es")
+        """
+        token = _LANGUAGE.set(lang)
+        try:
+            yield
+        finally:
+            _LANGUAGE.reset(token)
+
+    def measure(self, name):
+        """
+        Decorator running every call of the function as stage name
+
+        :param name: the name of the stage
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, value):
+        """
+        Add value to the counter name of the running stage (e.g. "frames")
+
+        :param name: the name of the counter
+        :param value: the amount to add
+        """
+        counters = getattr(self._counters, 'stack', None)
+        if counters:
+            counters[-1][name] = counters[-1].get(name, 0) + value
+
+    def api_call_started(self, context, **kwargs):
+        """
+        botocore before-call handler
+        """
+        context['metrics_started'] = time.perf_counter()
+
+    def api_call_finished(self, model, context, **kwargs):
+        """
+        botocore after-call handler recording the count and latency of the call
+        """
+        started = context.get('metrics_started')
+        if started is None:
+            return
+        latency = time.perf_counter() - started
+        name = "%s.%s" % (model.service_model.service_name, model.name)
+        with self._lock:
+            calls = self._api_calls.setdefault(name, [0, 0.0])
+            calls[0] += 1
+            calls[1] += latency
+
+    def instrument(self, client):
+        """
+        Record the API calls made through a boto3 client. The latency is timed
+        from the before-call handler registered here, so the handlers
+        registered before it, e.g. a rate limiter, are left out.
+
+        :param client: the client to instrument
+        """
+        client.meta.events.register('before-call', self.api_call_started)
+        client.meta.events.register('after-call', self.api_call_finished)
+
+    def api_calls(self):
+        """
+        Return a copy of the API call counters of the process
+        """
+        with self._lock:
+            return {name: list(calls) for name, calls in self._api_calls.items()}
+
+    def _api_calls_since(self, before):
+        calls = {}
+        for name, (count, seconds) in self.api_calls().items():
+            count -= before.get(name, [0, 0.0])[0]
+            seconds -= before.get(name, [0, 0.0])[1]
+            if count:
+                calls[name] = {'count': count, 'seconds': seconds}
+        return calls
+
+    def take(self):
+        """
+        Return the stages recorded so far and forget them
+        """
+        with self._lock:
+            stages, self._stages = self._stages, []
+        return stages
+
+    def merge(self, stages):
+        """
+        Add the stages recorded by a worker process
+
+        :param stages: the stages returned by collect
+        """
+        with self._lock:
+            self._stages.extend(stages)
+
+    def records(self, video):
+        """
+        Return one record per language, summing the stages of the same name
+
+        :param video: the source video the job works on
+        """
+        with self._lock:
+            stages = list(self._stages)
+
+        records = {}
+        for stage in stages:
+            language = stage['language'] or 'job'
+            record = records.setdefault(language, {
+                'video': video, 'language': language, 'timestamp': time.time(),
+                'stages': {}})
+            total = record['stages'].setdefault(stage['stage'], {})
+            for name, value in stage.items():
+                if name in ('stage', 'language'):
+                    continue
+                if name == 'api_calls':
+                    calls = total.setdefault('api_calls', {})
+                    for api, values in value.items():
+                        summed = calls.setdefault(api, {'count': 0, 'seconds': 0.0})
+                        summed['count'] += values['count']
+                        summed['seconds'] += values['seconds']
+                elif name.endswith('high_water_mb'):
+                    total[name] = max(total.get(name, 0), value)
+                else:
+                    total[name] = total.get(name, 0) + value
+            total['calls'] = total.get('calls', 0) + 1
+        return list(records.values())
+
+    def emit(self, video, output=None, emf=None):
+        """
+        Write the records of the job as JSON lines, in CloudWatch embedded
+        metric format when METRICS_FORMAT is "emf"
+
+        :param video: the source video the job works on
+        :param output: the file to write to (default: METRICS_FILE, or else stdout)
+        :param emf: whether to use the embedded metric format (default: METRICS_FORMAT)
+        """
+        if emf is None:
+            emf = os.getenv('METRICS_FORMAT', 'json') == 'emf'
+        lines = [json.dumps(embedded_metric_format(record) if emf else record)
+                 for record in self.records(video)]
+
+        output = output or os.getenv('METRICS_FILE')
+        if output:
+            with open(output, 'a') as file:
+                file.write("".join(line + "\n" for line in lines))
+        else:
+            for line in lines:
+                print(line, file=sys.stdout, flush=True)
+
+
+# Metrics CloudWatch accepts in one directive of an embedded metric format record
+EMF_MAX_METRICS = 100
+
+
+def metric_unit(name):
+    """
+    Return the CloudWatch unit of a measurement of a stage
+
+    :param name: the name of the measurement (e.g. "wall_seconds")
+    """
+    if name.endswith('_seconds'):
+        return 'Seconds'
+    if name.endswith('_mb'):
+        return 'Megabytes'
+    if name.startswith('bytes_'):
+        return 'Bytes'
+    return 'Count'
+
+
+def embedded_metric_format(record):
+    """
+    Convert a record into the CloudWatch embedded metric format: one metric
+    per stage and measurement, with the language as dimension, defined in
+    directives of at most EMF_MAX_METRICS metrics
+
+    :param record: a record returned by Metrics.records
+    """
+    document = {'Language': record['language'], 'Video': record['video']}
+    definitions = []
+
+    for stage, values in record['stages'].items():
+        for name, value in values.items():
+            if name == 'api_calls':
+                for api, calls in value.items():
+                    for field, unit in (('count', 'Count'), ('seconds', 'Seconds')):
+                        metric = "%s.%s.%s" % (stage, api, field)
+                        document[metric] = calls[field]
+                        definitions.append({'Name': metric, 'Unit': unit})
+                continue
+            metric = "%s.%s" % (stage, name)
+            document[metric] = value
+            definitions.append({'Name': metric, 'Unit': metric_unit(name)})
+
+    document['_aws'] = {
+        'Timestamp': int(record['timestamp'] * 1000),
+        'CloudWatchMetrics': [{
+            'Namespace': os.getenv('METRICS_NAMESPACE', 'VideoLocalization'),
+            'Dimensions': [['Language']],
+            'Metrics': definitions[start:start + EMF_MAX_METRICS]}
+            for start in range(0, len(definitions), EMF_MAX_METRICS)]}
+    return document
+
+
+METRICS = Metrics()
+
+
+def collect(function, *args):
+    """
+    Run function in a worker process and return its result together with the
+    stages it recorded, for the parent to merge into METRICS
+
+    :param function: the function to run
+    :param args: its arguments
+    :return: (result, stages)
+    """
+    # a forked worker starts with a copy of the stages of its parent
+    METRICS.take()
+    result = function(*args)
+    return result, METRICS.take()
@@ -0,0 +1,188 @@
+"""
+Pure-Python MP3 duration probe working on the frame headers
+"""
+
+# bitrates in kbps, indexed by [version is MPEG-1][layer][bitrate index]
+BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    },
+}
+
+# sample rates in Hz, indexed by the version bits of the header
+SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),   # MPEG-2.5
+}
+
+
+class FrameHeader:
+    """
+    The fields of an MPEG audio frame header needed to walk the stream
+    """
+
+    def __init__(self, version, layer, bitrate, sample_rate, padding, mono):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.mono = mono
+
+    @property
+    def mpeg1(self):
+        return self.version == 3
+
+    @property
+    def samples(self):
+        """
+        Number of samples per channel in the frame
+        """
+        if self.layer == 1:
+            return 384
+        if self.layer == 3 and not self.mpeg1:
+            return 576
+        return 1152
+
+    @property
+    def length(self):
+        """
+        Length of the frame in bytes, header included
+        """
+        if self.layer == 1:
+            return (12 * self.bitrate * 1000 // self.sample_rate + self.padding) * 4
+        return self.samples // 8 * self.bitrate * 1000 // self.sample_rate + self.padding
+
+    @property
+    def side_info_length(self):
+        if self.mpeg1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+def parse_header(data, pos):
+    """
+    Return the FrameHeader at pos in data, or None if there is no valid header there
+
+    :param data: the MP3 bytes
+    :param pos: the offset of the candidate header
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+
+    version = (data[pos + 1] >> 3) & 3
+    layer = 4 - ((data[pos + 1] >> 1) & 3)
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    return FrameHeader(version, layer,
+                       BITRATES[version == 3][layer][bitrate_index],
+                       SAMPLE_RATES[version][sample_rate_index],
+                       (data[pos + 2] >> 1) & 1,
+                       data[pos + 3] >> 6 == 3)
+
+
+def skip_id3v2(data):
+    """
+    Return the offset of the first byte after the ID3v2 tag, if any
+
+    :param data: the MP3 bytes
+    """
+    if len(data) < 10 or bytes(data[:3]) != b'ID3':
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_first_frame(data, pos=0):
+    """
+    Return the offset and header of the first frame at or after pos,
+    requiring the following frame to be valid as well to skip false syncs
+
+    :param data: the MP3 bytes
+    :param pos: the offset to start searching at
+    """
+    while pos + 4 <= len(data):
+        header = parse_header(data, pos)
+        if header is not None:
+            following = pos + header.length
+            if following + 4 > len(data) or parse_header(data, following) is not None:
+                return pos, header
+        pos += 1
+    return None, None
+
+
+def read_vbr_frames(data, pos, header):
+    """
+    Return the number of frames announced by a Xing/Info or VBRI header in the
+    first frame, or None when the first frame is a regular audio frame
+
+    :param data: the MP3 bytes
+    :param pos: the offset of the first frame
+    :param header: the header of the first frame
+    """
+    xing = pos + 4 + header.side_info_length
+    if bytes(data[xing:xing + 4]) in (b'Xing', b'Info'):
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 1:
+            return int.from_bytes(data[xing + 8:xing + 12], 'big')
+
+    vbri = pos + 4 + 32
+    if bytes(data[vbri:vbri + 4]) == b'VBRI':
+        return int.from_bytes(data[vbri + 14:vbri + 18], 'big')
+
+    return None
+
+
+def audio_frames(data):
+    """
+    Return the part of the MP3 bytes that holds audio frames only, without the
+    ID3v2 tag and without a leading Xing/Info or VBRI frame, so that several
+    streams can be concatenated into one
+
+    :param data: the MP3 bytes
+    """
+    data = memoryview(data)
+    pos, header = find_first_frame(data, skip_id3v2(data))
+    if header is None:
+        return data[len(data):]
+    if read_vbr_frames(data, pos, header) is not None:
+        pos += header.length
+    return data[pos:]
+
+
+def mp3_duration(source):
+    """
+    Return the duration in seconds of an MP3 stream, read from the Xing/VBRI
+    header when present, else by walking the frame headers. Nothing is decoded.
+
+    :param source: the MP3 content as bytes, a buffer, or a binary file object
+    """
+    data = source.read() if hasattr(source, 'read') else memoryview(source)
+
+    pos, header = find_first_frame(data, skip_id3v2(data))
+    if header is None:
+        return 0.0
+
+    frames = read_vbr_frames(data, pos, header)
+    if frames is not None:
+        return frames * header.samples / header.sample_rate
+
+    sample_rate = header.sample_rate
+    samples = 0
+    while header is not None:
+        samples += header.samples
+        pos += header.length
+        header = parse_header(data, pos)
+    return samples / sample_rate
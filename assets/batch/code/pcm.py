@@ -0,0 +1,174 @@
+"""
+In-memory 16-bit PCM audio tracks, handed from the Amazon Polly stream to
+ffmpeg through a pipe, without a temporary audio file
+"""
+import os
+import shutil
+import tempfile
+import threading
+import wave
+from contextlib import contextmanager
+
+import numpy as np
+
+# Sample rate Amazon Polly returns PCM at: 8000 or 16000 Hz, mono signed 16-bit little-endian
+PCM_SAMPLE_RATE = 16000
+
+# Bytes read from a response stream at a time
+STREAM_CHUNK_BYTES = 256 * 1024
+
+
+def get_audio_format():
+    """
+    Return AUDIO_FORMAT, read on every call so each job of a warm worker gets
+    its own: "mp3" writes the synthesized tracks to disk, "pcm" keeps them in memory
+    """
+    return os.getenv('AUDIO_FORMAT', 'mp3')
+
+
+def read_stream(stream, chunk_bytes=STREAM_CHUNK_BYTES):
+    """
+    Read a response stream chunk by chunk into a single growing buffer
+
+    :param stream: the stream to read, e.g. the AudioStream of a Polly response
+    :param chunk_bytes: the size of a read
+    :return: the bytearray of everything read
+    """
+    data = bytearray()
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            return data
+        data += chunk
+
+
+def pcm_samples(data):
+    """
+    Return PCM bytes as an int16 array sharing their memory
+
+    :param data: signed 16-bit little-endian PCM bytes
+    """
+    return np.frombuffer(data, dtype='<i2')
+
+
+class PcmTracks:
+    """
+    The in-memory tracks of a job, keyed on the audio file name the rest of
+    the pipeline passes around, so a track can be used wherever a file is
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tracks = {}
+
+    def put(self, file_name, data):
+        """
+        Keep PCM bytes as the track of file_name
+
+        :param file_name: the audio file name of the track (e.g. "audio-es.wav")
+        :param data: signed 16-bit little-endian PCM bytes at PCM_SAMPLE_RATE
+        """
+        with self._lock:
+            self._tracks[file_name] = pcm_samples(data)
+
+    def get(self, file_name):
+        """
+        Return the int16 samples of the track of file_name, or None if it is not in memory
+        """
+        with self._lock:
+            return self._tracks.get(file_name)
+
+    def clear(self):
+        """
+        Forget every track, e.g. between the jobs of a warm worker
+        """
+        with self._lock:
+            self._tracks.clear()
+
+    def duration(self, file_name):
+        """
+        Return the duration in seconds of the track of file_name, or None if it is not in memory
+        """
+        samples = self.get(file_name)
+        return None if samples is None else len(samples) / PCM_SAMPLE_RATE
+
+    def ffmpeg_input(self, file_name):
+        """
+        Return the ffmpeg input arguments and the stdin data reading the track
+        in memory from a pipe, or else the file
+
+        :return: (arguments, bytes or None)
+        """
+        samples = self.get(file_name)
+        if samples is None:
+            return ["-i", file_name], None
+        return (["-f", "s16le", "-ar", str(PCM_SAMPLE_RATE), "-ac", "1", "-i", "pipe:0"],
+                samples.data)
+
+    @contextmanager
+    def wav_pipe(self, file_name, duration=None):
+        """
+        Stream the track in memory as a WAV file through a named pipe, for
+        the MoviePy writers that take the audio as a file name. Yields the
+        path of the pipe, or None for a track that is not in memory.
+
+        :param file_name: the audio file name of the track
+        :param duration: optional duration in seconds the track is cut to
+        """
+        samples = self.get(file_name)
+        if samples is None:
+            yield None
+            return
+        if duration is not None:
+            samples = samples[:int(round(duration * PCM_SAMPLE_RATE))]
+
+        directory = tempfile.mkdtemp(prefix="pcm-")
+        path = os.path.join(directory, "audio.wav")
+        os.mkfifo(path)
+
+        def feed():
+            try:
+                # opening blocks until ffmpeg opens the other end
+                with open(path, "wb") as pipe, wave.open(pipe, "wb") as file:
+                    file.setnchannels(1)
+                    file.setsampwidth(2)
+                    file.setframerate(PCM_SAMPLE_RATE)
+                    # with the length known up front the header is never rewritten
+                    file.setnframes(len(samples))
+                    file.writeframes(samples.data)
+            except OSError:
+                # ffmpeg stopped reading, it reports its own error
+                pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            yield path
+        finally:
+            # release the feeder if ffmpeg never opened the pipe, until it
+            # reaches its open() the read end has to be opened again
+            while feeder.is_alive():
+                try:
+                    os.close(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+                except OSError:
+                    pass
+                feeder.join(0.1)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def materialize(self, file_name):
+        """
+        Write the track in memory as a WAV file, for the consumers that need
+        one (checkpoints, the soft subtitle remux). Does nothing for a track
+        that is already a file.
+        """
+        samples = self.get(file_name)
+        if samples is None or os.path.exists(file_name):
+            return
+        with wave.open(file_name, "wb") as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(PCM_SAMPLE_RATE)
+            file.writeframes(samples.data)
+
+
+PCM_TRACKS = PcmTracks()
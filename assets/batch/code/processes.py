@@ -0,0 +1,77 @@
+"""
+Process pools that can be stopped in the middle of a job: when the block is
+left by an interrupt such as worker.JobOverBudget, the worker processes and
+everything they started, e.g. ffmpeg, are killed instead of waited for
+"""
+import logging
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+
+def descendants(pid):
+    """
+    Return the pids of the children of a process, their children and so on,
+    or an empty list where /proc does not list children
+
+    :param pid: the process
+    """
+    found = []
+    pids = [pid]
+    while pids:
+        parent = pids.pop()
+        try:
+            tasks = os.listdir('/proc/%d/task' % parent)
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open('/proc/%d/task/%s/children' % (parent, task)) as file:
+                    children = [int(child) for child in file.read().split()]
+            except (OSError, ValueError):
+                continue
+            found.extend(children)
+            pids.extend(children)
+    return found
+
+
+def kill_pool(executor):
+    """
+    Kill the worker processes of a ProcessPoolExecutor and their descendants,
+    then shut it down without waiting. The futures still running or pending
+    fail with BrokenProcessPool.
+
+    :param executor: the ProcessPoolExecutor
+    """
+    # listed before any is killed, an orphan is no longer a child of its parent
+    workers = list(executor._processes or ())
+    pids = workers + [pid for worker in workers for pid in descendants(worker)]
+    logging.warning("\t==> Killing %d pool processes", len(pids))
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    executor.shutdown(wait=False)
+
+
+@contextmanager
+def process_pool(workers):
+    """
+    ProcessPoolExecutor that is shut down as usual when the block finishes
+    or raises an Exception, and killed with kill_pool when it is interrupted
+    by any other BaseException, e.g. worker.JobOverBudget or KeyboardInterrupt
+
+    :param workers: the maximum number of worker processes
+    """
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield executor
+    except Exception:
+        executor.shutdown()
+        raise
+    except BaseException:
+        kill_pool(executor)
+        raise
+    executor.shutdown()
@@ -0,0 +1,102 @@
+"""
+Array-based segmentation of a Transcript into subtitle phrases
+"""
+import numpy as np
+
+from transcript import PRONUNCIATION
+
+
+def split_points(starts, ends, max_words=10, max_duration=None, max_gap=None):
+    """
+    Return the index of the first word of every phrase. A phrase ends after
+    max_words words, before a word that would make it last longer than
+    max_duration seconds, or at a silence longer than max_gap seconds.
+
+    Word and gap limits are applied with array operations only; a duration
+    limit takes one binary search per phrase.
+
+    :param starts: the start time of every word, in order
+    :param ends: the end time of every word
+    :param max_words: maximum number of words in a phrase, None for no limit
+    :param max_duration: maximum length of a phrase in seconds, None for no limit
+    :param max_gap: silence in seconds that always starts a new phrase, None to ignore silences
+    """
+    count = len(starts)
+    max_words = max_words or max(count, 1)
+
+    # runs of words separated by silences
+    run_starts = np.zeros(1, dtype=np.int64)
+    if max_gap is not None and count > 1:
+        gaps = starts[1:] - ends[:-1]
+        run_starts = np.concatenate((run_starts, np.flatnonzero(gaps > max_gap) + 1))
+
+    if max_duration is None:
+        run_of_word = np.zeros(count, dtype=np.int64)
+        run_of_word[run_starts[1:]] = 1
+        position = np.arange(count) - run_starts[np.cumsum(run_of_word)]
+        return np.flatnonzero(position % max_words == 0)
+
+    points = []
+    run_ends = np.append(run_starts[1:], count).tolist()
+    for run_start, run_end in zip(run_starts.tolist(), run_ends):
+        i = run_start
+        while i < run_end:
+            points.append(i)
+            limit = min(i + max_words, run_end)
+            # first word ending too late for the phrase, keeping at least one word
+            fits = int(np.searchsorted(ends, starts[i] + max_duration, side='right'))
+            i = max(min(fits, limit), i + 1)
+    return np.array(points, dtype=np.int64)
+
+
+def segment_transcript(transcript, max_words=10, max_duration=None, max_gap=None):
+    """
+    Group the items of a transcript into phrases. Punctuation stays with the
+    word before it, and the last, shorter phrase is kept.
+
+    :param transcript: the Transcript to segment
+    :param max_words: maximum number of words in a phrase, None for no limit
+    :param max_duration: maximum length of a phrase in seconds, None for no limit
+    :param max_gap: silence in seconds that always starts a new phrase, None to ignore silences
+    :return: (starts, ends, texts) with the start and end time in seconds and the text of every phrase
+    """
+    types = np.frombuffer(transcript.types, dtype=np.uint8)
+    word_items = np.flatnonzero(types == PRONUNCIATION)
+    if not len(word_items):
+        return np.zeros(0), np.zeros(0), []
+
+    starts = np.frombuffer(transcript.start_times, dtype=np.float64)[word_items]
+    ends = np.frombuffer(transcript.end_times, dtype=np.float64)[word_items]
+
+    first_words = split_points(starts, ends, max_words, max_duration, max_gap)
+    last_words = np.append(first_words[1:], len(word_items)) - 1
+
+    # the items of a phrase run up to the first word of the next one
+    item_bounds = np.append(word_items[first_words], len(transcript))
+    item_bounds[0] = 0
+
+    return starts[first_words], ends[last_words], phrase_texts(transcript, word_items,
+                                                               item_bounds)
+
+
+def phrase_texts(transcript, word_items, item_bounds):
+    """
+    Return the text of the items between consecutive bounds, with a space in
+    front of every word but none in front of punctuation
+
+    :param transcript: the Transcript the items belong to
+    :param word_items: the indices of the pronunciation items
+    :param item_bounds: the index of the first item of every phrase, then the number of items
+    """
+    offsets = np.asarray(transcript.offsets, dtype=np.int64)
+    contents = transcript.contents
+
+    # insert a space in the content table in front of every word
+    cuts = offsets[word_items].tolist()
+    joined = " ".join(contents[start:end] for start, end in
+                      zip([0] + cuts, cuts + [len(contents)]))
+
+    # position of each bound in joined: its offset plus the spaces inserted before it
+    positions = (offsets[item_bounds] +
+                 np.searchsorted(word_items, item_bounds, side='left')).tolist()
+    return [joined[start:end].lstrip(" ") for start, end in zip(positions, positions[1:])]
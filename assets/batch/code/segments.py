@@ -0,0 +1,108 @@
+"""
+Split a video into keyframe-aligned segments that render independently, and
+join the rendered segments back without re-encoding
+"""
+import csv
+import os
+
+from ffmpeg_backend import run_ffmpeg
+from pcm import PCM_TRACKS
+from srt import write_srt_file
+
+
+def split_video(video_file_name, segment_seconds, directory):
+    """
+    Cut the video stream into segments of about segment_seconds with a stream
+    copy. The cuts land on the first keyframe after each multiple of
+    segment_seconds, so the segments decode on their own.
+
+    :param video_file_name: the video to split (e.g. "video.mp4")
+    :param segment_seconds: the target length of a segment
+    :param directory: where the segment files are written
+    :return: list of (segment file name, start, end) tuples, in order
+    """
+    list_file_name = os.path.join(directory, "segments.csv")
+    run_ffmpeg(["-i", video_file_name, "-map", "0:v", "-an", "-c", "copy",
+                "-f", "segment", "-segment_time", str(segment_seconds),
+                "-reset_timestamps", "1",
+                "-segment_list", list_file_name, "-segment_list_type", "csv",
+                os.path.join(directory, "segment-%05d.mp4")])
+
+    with open(list_file_name, newline='') as file:
+        return [(os.path.join(directory, name), float(start), float(end))
+                for name, start, end in csv.reader(file)]
+
+
+def split_subtitles(subtitles, start, end):
+    """
+    Return the subtitles visible between start and end, shifted so the
+    segment starts at 0. An entry crossing a boundary is clipped to each side
+    of it, so every instant of every entry is shown by exactly one segment.
+
+    :param subtitles: list of ((start, end), text) tuples, as returned by file_to_subtitles
+    :param start: the start of the segment in the source video
+    :param end: the end of the segment in the source video
+    """
+    return [((max(sub_start, start) - start, min(sub_end, end) - start), txt)
+            for (sub_start, sub_end), txt in subtitles
+            if sub_start < end and sub_end > start]
+
+
+def split_srt(subtitles_file_name, segments, directory):
+    """
+    Write one shifted SRT file per segment
+
+    :param subtitles_file_name: the SRT file of the whole video
+    :param segments: the segments, as returned by split_video
+    :param directory: where the SRT files are written
+    :return: list of the SRT file names, in the order of the segments
+    """
+    from moviepy.video.tools.subtitles import file_to_subtitles
+
+    subtitles = file_to_subtitles(subtitles_file_name)
+    srt_file_names = []
+    for n, (_, start, end) in enumerate(segments):
+        srt_file_name = os.path.join(directory, "segment-%05d.srt" % n)
+        entries = split_subtitles(subtitles, start, end)
+        write_srt_file([times[0] for times, _ in entries], [times[1] for times, _ in entries],
+                       [txt for _, txt in entries], srt_file_name)
+        srt_file_names.append(srt_file_name)
+    return srt_file_names
+
+
+def concat_segments(segment_file_names, output_file_name, directory):
+    """
+    Join rendered segments with the concat demuxer and a stream copy
+
+    :param segment_file_names: the rendered segments, in order
+    :param output_file_name: the video file to write
+    :param directory: where the concat list is written
+    """
+    list_file_name = os.path.join(directory, "concat.txt")
+    with open(list_file_name, "w") as file:
+        for segment_file_name in segment_file_names:
+            file.write("file '%s'\n" % os.path.abspath(segment_file_name))
+    run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_file_name,
+                "-map", "0:v", "-c", "copy", output_file_name])
+
+
+def mux_audio(video_file_name, audio_source_name, output_file_name, profile, copy=False):
+    """
+    Put the audio of audio_source_name under the video stream of video_file_name,
+    cut to the length of the video
+
+    :param video_file_name: the joined video
+    :param audio_source_name: the original video or the dubbed audio track
+    :param output_file_name: the video file to write
+    :param profile: the encoder profile, as returned by encoding.get_encoder_profile
+    :param copy: copy the audio stream as-is instead of encoding it with the profile
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    audio_codec = ["-c:a", "copy"] if copy else \
+        ["-c:a", profile['audio_codec'], "-b:a", profile['audio_bitrate']]
+    audio_input, audio = PCM_TRACKS.ffmpeg_input(audio_source_name)
+    run_ffmpeg(["-i", video_file_name] + audio_input +
+               ["-map", "0:v", "-map", "1:a?", "-c:v", "copy"] + audio_codec +
+               ["-t", str(ffmpeg_parse_infos(video_file_name)['duration']),
+                output_file_name], input=audio)
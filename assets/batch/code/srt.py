@@ -0,0 +1,55 @@
+"""
+SRT time codes and files, formatted in batches and written in one go
+"""
+import numpy as np
+
+
+def format_time_codes(seconds):
+    """
+    Format times as SRT HH:MM:SS,mmm time codes in one pass
+
+    :param seconds: sequence or array of times in seconds
+    :return: list of the time codes
+    """
+    millis = np.rint(np.asarray(seconds, dtype=np.float64) * 1000).astype(np.int64)
+    hours, millis = np.divmod(millis, 3600000)
+    minutes, millis = np.divmod(millis, 60000)
+    secs, millis = np.divmod(millis, 1000)
+    return ["%02d:%02d:%02d,%03d" % fields for fields in
+            zip(hours.tolist(), minutes.tolist(), secs.tolist(), millis.tolist())]
+
+
+def format_time_code(seconds):
+    """
+    Format a single time as an SRT HH:MM:SS,mmm time code
+
+    :param seconds: the time in seconds
+    """
+    return format_time_codes([seconds])[0]
+
+
+def format_srt(starts, ends, texts):
+    """
+    Return the SRT document of the given entries
+
+    :param starts: the start time of every entry, in seconds
+    :param ends: the end time of every entry, in seconds
+    :param texts: the text of every entry
+    """
+    lines = ["%d\n%s --> %s\n%s\n\n" % entry for entry in
+             zip(range(1, len(texts) + 1), format_time_codes(starts),
+                 format_time_codes(ends), texts)]
+    return "".join(lines)
+
+
+def write_srt_file(starts, ends, texts, srt_file_name):
+    """
+    Write the entries as an SRT file with a single buffered write
+
+    :param starts: the start time of every entry, in seconds
+    :param ends: the end time of every entry, in seconds
+    :param texts: the text of every entry
+    :param srt_file_name: the name of the SRT file (e.g. "mySRT.srt")
+    """
+    with open(srt_file_name, "w", encoding="utf-8") as file:
+        file.write(format_srt(starts, ends, texts))
@@ -0,0 +1,207 @@
+"""
+Small key/value object stores backed by a local directory or an S3 prefix
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+from transfer import get_transfer_config
+
+
+class LocalStore:
+    """
+    Store objects as files below a local directory
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: the directory the objects are stored in, a relative
+                          one is resolved now, before a job changes directory
+        """
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _temporary(self, key):
+        # objects are written to a file of their own next to the key first, then
+        # moved over it, so readers never see partial objects and concurrent
+        # writers of the same key do not share a temporary file
+        directory = os.path.dirname(self._path(key))
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False)
+
+    def get(self, key):
+        """
+        Return the bytes stored under key, or None if there are none
+
+        :param key: the object key
+        """
+        try:
+            with open(self._path(key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        """
+        Store data under key
+
+        :param key: the object key
+        :param data: the bytes to store
+        """
+        with self._temporary(key) as file:
+            file.write(data)
+        os.replace(file.name, self._path(key))
+
+    def delete(self, key):
+        """
+        Remove the object stored under key, if any
+
+        :param key: the object key
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        """
+        Return True if an object is stored under key
+
+        :param key: the object key
+        """
+        return os.path.exists(self._path(key))
+
+    def get_file(self, key, file_name):
+        """
+        Copy the object stored under key to a local file
+
+        :param key: the object key
+        :param file_name: the local file to write
+        :return: True if the object existed, else False
+        """
+        try:
+            shutil.copyfile(self._path(key), file_name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put_file(self, key, file_name):
+        """
+        Store the content of a local file under key
+
+        :param key: the object key
+        :param file_name: the local file to read
+        """
+        with self._temporary(key) as file, open(file_name, 'rb') as source:
+            shutil.copyfileobj(source, file)
+        os.replace(file.name, self._path(key))
+
+
+class S3Store:
+    """
+    Store objects below a prefix of an S3 bucket
+    """
+
+    def __init__(self, uri):
+        """
+        :param uri: the location in format s3://bucket/prefix
+        """
+        bucket, _, prefix = uri[5:].partition('/')
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/')
+
+    def _key(self, key):
+        return self.prefix + '/' + key if self.prefix else key
+
+    def _client(self):
+        return get_client('s3')
+
+    def get(self, key):
+        """
+        Return the bytes stored under key, or None if there are none
+
+        :param key: the object key
+        """
+        try:
+            response = self._client().get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as local_error:
+            if local_error.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                logging.error(local_error)
+            return None
+        return response['Body'].read()
+
+    def put(self, key, data):
+        """
+        Store data under key
+
+        :param key: the object key
+        :param data: the bytes to store
+        """
+        self._client().put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def delete(self, key):
+        """
+        Remove the object stored under key, if any
+
+        :param key: the object key
+        """
+        self._client().delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def exists(self, key):
+        """
+        Return True if an object is stored under key
+
+        :param key: the object key
+        """
+        try:
+            self._client().head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as local_error:
+            if local_error.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                logging.error(local_error)
+            return False
+        return True
+
+    def get_file(self, key, file_name):
+        """
+        Download the object stored under key to a local file
+
+        :param key: the object key
+        :param file_name: the local file to write
+        :return: True if the object existed, else False
+        """
+        try:
+            self._client().download_file(self.bucket, self._key(key), file_name,
+                                         Config=get_transfer_config())
+        except ClientError as local_error:
+            if local_error.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                logging.error(local_error)
+            return False
+        return True
+
+    def put_file(self, key, file_name):
+        """
+        Upload a local file under key
+
+        :param key: the object key
+        :param file_name: the local file to read
+        """
+        self._client().upload_file(file_name, self.bucket, self._key(key),
+                                   Config=get_transfer_config())
+
+
+def open_store(location):
+    """
+    Return the store for location: an S3Store for s3:// URIs, else a LocalStore
+
+    :param location: s3://bucket/prefix or a local directory
+    """
+    if location.startswith('s3://'):
+        return S3Store(location)
+    return LocalStore(location)
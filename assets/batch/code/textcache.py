@@ -0,0 +1,125 @@
+"""
+Memoizing layer for the ImageMagick text rasterization done through TextClip
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TextBitmapCache:
+    """
+    LRU cache of rendered text bitmaps (RGBA uint8 arrays), keyed on
+    (text, font, fontsize, color, background), with an optional directory
+    the bitmaps are spilled to so that re-runs can reuse them.
+    """
+
+    def __init__(self, max_entries=512, spill_dir=None):
+        """
+        :param max_entries: maximum number of bitmaps kept in memory
+        :param spill_dir: optional directory to persist the bitmaps to
+        """
+        self.max_entries = max_entries
+        # resolved now, a warm worker runs every job in its own directory
+        self.spill_dir = os.path.abspath(spill_dir) if spill_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    def render(self, txt, font, fontsize, color, background=None):
+        """
+        Return the RGBA bitmap for the given text, rasterizing it only on a miss
+
+        :param txt: the text to render
+        :param font: the ImageMagick font name
+        :param fontsize: the size of the font
+        :param color: the color of the text
+        :param background: optional RGB color of an opaque box behind the text
+        """
+        if background is not None:
+            background = tuple(background)
+        key = (txt, font, fontsize, color, background)
+
+        bitmap = self._entries.get(key)
+        if bitmap is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return bitmap
+
+        spill_file = self._spill_file(key)
+        if spill_file and os.path.exists(spill_file):
+            bitmap = np.load(spill_file)
+            self.disk_hits += 1
+        else:
+            bitmap = rasterize_text(txt, font, fontsize, color, background)
+            self.misses += 1
+            if spill_file:
+                self._spill(spill_file, bitmap)
+
+        self._entries[key] = bitmap
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return bitmap
+
+    def stats(self):
+        """
+        Return the hit/miss counters of the cache
+        """
+        return {'hits': self.hits, 'disk_hits': self.disk_hits,
+                'misses': self.misses, 'entries': len(self._entries)}
+
+    def log_stats(self):
+        """
+        Log the hit/miss counters of the cache
+        """
+        logging.info("\t==> Text cache: %(hits)d hits, %(disk_hits)d disk hits, "
+                     "%(misses)d misses, %(entries)d entries" % self.stats())
+
+    def _spill(self, spill_file, bitmap):
+        # write to a temporary file first so that the other processes sharing
+        # the directory never load a partial bitmap
+        with tempfile.NamedTemporaryFile(dir=self.spill_dir, suffix=".tmp",
+                                         delete=False) as file:
+            np.save(file, bitmap)
+        os.replace(file.name, spill_file)
+
+    def _spill_file(self, key):
+        if not self.spill_dir:
+            return None
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, digest + ".npy")
+
+
+def rasterize_text(txt, font, fontsize, color, background=None):
+    """
+    Rasterize text through ImageMagick and return it as an RGBA uint8 array
+
+    :param txt: the text to render
+    :param font: the ImageMagick font name
+    :param fontsize: the size of the font
+    :param color: the color of the text
+    :param background: optional RGB color of an opaque box behind the text
+    """
+    from moviepy.video.VideoClip import TextClip
+
+    txtclip = TextClip(txt, fontsize=fontsize, font=font, color=color)
+
+    if background is not None:
+        rgb = txtclip.on_color(color=list(background)).get_frame(0)
+        alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+    else:
+        rgb = txtclip.get_frame(0)
+        alpha = (txtclip.mask.get_frame(0) * 255).astype(np.uint8)
+
+    return np.dstack([rgb.astype(np.uint8), alpha])
+
+
+TEXT_CACHE = TextBitmapCache(max_entries=int(os.getenv('TEXT_CACHE_SIZE', '512')),
+                             spill_dir=os.getenv('TEXT_CACHE_DIR'))
@@ -0,0 +1,154 @@
+"""
+Columnar, parse-once model of an Amazon Transcribe JSON output
+"""
+import io
+import json
+import logging
+import math
+import pickle
+from array import array
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - fall back to loading the whole document
+    ijson = None
+
+
+PRONUNCIATION = 0
+PUNCTUATION = 1
+
+ITEM_TYPES = {'pronunciation': PRONUNCIATION, 'punctuation': PUNCTUATION}
+
+
+class Transcript:
+    """
+    Transcript text plus its items stored column by column: start and end
+    times as float arrays (NaN for punctuation), item types as a byte array
+    and the contents of all items in a single string table.
+    """
+
+    def __init__(self, text='', start_times=None, end_times=None, types=None,
+                 contents='', offsets=None):
+        self.text = text
+        self.start_times = start_times if start_times is not None else array('d')
+        self.end_times = end_times if end_times is not None else array('d')
+        self.types = types if types is not None else array('B')
+        self.contents = contents
+        self.offsets = offsets if offsets is not None else array('L', [0])
+
+    def __len__(self):
+        return len(self.types)
+
+    def content(self, i):
+        """
+        Return the content of the i-th item
+
+        :param i: the index of the item
+        """
+        return self.contents[self.offsets[i]:self.offsets[i + 1]]
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Load the transcript from an Amazon Transcribe JSON file. When ijson is
+        installed the document is streamed, so memory stays bounded by the
+        size of the columns rather than the size of the JSON tree.
+
+        :param file_name: the name of the JSON file (e.g. "transcribe.json")
+        """
+        logging.info("==> Loading transcript: " + file_name)
+        builder = _TranscriptBuilder()
+
+        with open(file_name, 'rb') as file:
+            if ijson is not None:
+                builder.parse_events(ijson.parse(file))
+            else:
+                builder.parse_document(json.load(file))
+
+        transcript = builder.build()
+        logging.info("\t==> Loaded %d items" % len(transcript))
+        return transcript
+
+    def save(self, file_name):
+        """
+        Write the parsed columns to a file that load_parsed reads back
+        without parsing the JSON again
+
+        :param file_name: the name of the file (e.g. "transcript.pickle")
+        """
+        with open(file_name, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_parsed(cls, file_name):
+        """
+        Read a transcript written by save
+
+        :param file_name: the name of the file (e.g. "transcript.pickle")
+        """
+        with open(file_name, 'rb') as file:
+            transcript = pickle.load(file)
+        logging.info("==> Loaded %d parsed transcript items: %s" % (len(transcript), file_name))
+        return transcript
+
+
+def load_transcript(transcript):
+    """
+    Return transcript as a Transcript, loading it if a file name is given
+
+    :param transcript: a Transcript or the name of an Amazon Transcribe JSON file
+    """
+    if isinstance(transcript, Transcript):
+        return transcript
+    return Transcript.load(transcript)
+
+
+class _TranscriptBuilder:
+    """
+    Accumulates transcript items into the columns of a Transcript
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.start_times = array('d')
+        self.end_times = array('d')
+        self.types = array('B')
+        self.contents = io.StringIO()
+        self.offsets = array('L', [0])
+        self.length = 0
+
+    def add_item(self, item_type, start_time, end_time, content):
+        self.types.append(ITEM_TYPES[item_type])
+        self.start_times.append(float(start_time) if start_time is not None else math.nan)
+        self.end_times.append(float(end_time) if end_time is not None else math.nan)
+        self.length += self.contents.write(content)
+        self.offsets.append(self.length)
+
+    def parse_document(self, document):
+        results = document['results']
+        self.text = results['transcripts'][0]['transcript']
+        for item in results['items']:
+            self.add_item(item['type'], item.get('start_time'), item.get('end_time'),
+                          item['alternatives'][0]['content'])
+
+    def parse_events(self, events):
+        item = None
+        for prefix, event, value in events:
+            if prefix == 'results.transcripts.item.transcript' and not self.text:
+                self.text = value
+            elif prefix == 'results.items.item':
+                if event == 'start_map':
+                    item = {}
+                elif event == 'end_map':
+                    self.add_item(item['type'], item.get('start_time'),
+                                  item.get('end_time'), item.get('content', ''))
+            elif prefix in ('results.items.item.type', 'results.items.item.start_time',
+                            'results.items.item.end_time'):
+                item[prefix.rsplit('.', 1)[1]] = value
+            elif prefix == 'results.items.item.alternatives.item.content':
+                # keep the content of the first alternative only
+                item.setdefault('content', value)
+
+    def build(self):
+        return Transcript(self.text, self.start_times, self.end_times, self.types,
+                          self.contents.getvalue(), self.offsets)
@@ -0,0 +1,142 @@
+"""
+S3 transfers with a tunable TransferConfig, run in the background when needed
+"""
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+from metrics import METRICS
+
+MB = 1024 * 1024
+
+
+def get_transfer_config():
+    """
+    Return the TransferConfig of S3_PART_SIZE_MB parts and S3_CONCURRENCY
+    threads, read on every transfer so each job of a warm worker gets its own
+    """
+    part_size = int(os.getenv('S3_PART_SIZE_MB', '16')) * MB
+    return TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                          max_concurrency=int(os.getenv('S3_CONCURRENCY', '10')))
+
+
+def log_throughput(action, file_name, started):
+    """
+    Log the size, duration and throughput of a finished transfer
+
+    :param action: "Downloaded" or "Uploaded"
+    :param file_name: the local file that was transferred
+    :param started: the time.monotonic() at which the transfer started
+    """
+    elapsed = max(time.monotonic() - started, 1e-6)
+    size = os.path.getsize(file_name)
+    logging.info("\t==> %s %s: %.1f MB in %.2f s (%.1f MB/s)" %
+                 (action, file_name, size / MB, elapsed, size / MB / elapsed))
+
+
+@METRICS.measure('download')
+def download_file_from_s3(input_file_name, output_file_name):
+    """Download a file from an S3 bucket
+
+    :param input_file_name: input file in format s3://
+    :param output_file_name: S3 object name after download
+    :return: True if file was downloaded, else False
+    """
+    if not input_file_name.startswith('s3://'):
+        logging.error("Wrong input filename")
+        return False
+
+    # Remove the 's3://' prefix
+    path_without_prefix = input_file_name[5:]
+    # Split the path into bucket and object parts
+    bucket_name, object_name = path_without_prefix.split('/', 1)
+    s3_client = get_client('s3')
+    started = time.monotonic()
+    try:
+        s3_client.download_file(bucket_name, object_name, output_file_name,
+                                Config=get_transfer_config())
+    except ClientError as local_error:
+        logging.error(local_error)
+        return False
+    log_throughput("Downloaded", output_file_name, started)
+    return True
+
+
+@METRICS.measure('upload')
+def upload_file_to_s3(file_name, bucket, object_name=None):
+    """Upload a file to an S3 bucket
+
+    :param file_name: File to upload
+    :param bucket: Bucket to upload to
+    :param object_name: S3 object name. If not specified then file_name is used
+    :return: True if file was uploaded, else False
+    """
+
+    # If S3 object_name was not specified, use file_name
+    if object_name is None:
+        object_name = os.path.basename(file_name)
+
+    # Upload the file
+    s3_client = get_client('s3')
+    started = time.monotonic()
+    try:
+        s3_client.upload_file(file_name, bucket, object_name, Config=get_transfer_config())
+    except ClientError as local_error:
+        logging.error(local_error)
+        return False
+    log_throughput("Uploaded", file_name, started)
+    return True
+
+
+class BackgroundTransfers:
+    """
+    Runs downloads and uploads in background threads and keeps track of the
+    uploads so the job can wait on all of them before exiting. The transfers
+    run in the context they were queued from, so their metrics keep its language.
+    """
+
+    def __init__(self, max_workers=4):
+        """
+        :param max_workers: number of transfers running at the same time
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.uploads = []
+
+    def download(self, input_file_name, output_file_name):
+        """
+        Start download_file_from_s3 in the background and return its future
+        """
+        return self.executor.submit(contextvars.copy_context().run, download_file_from_s3,
+                                    input_file_name, output_file_name)
+
+    def upload(self, file_name, bucket, object_name=None):
+        """
+        Start upload_file_to_s3 in the background and return its future
+        """
+        future = self.executor.submit(contextvars.copy_context().run, upload_file_to_s3,
+                                      file_name, bucket, object_name)
+        self.uploads.append((object_name or os.path.basename(file_name), future))
+        return future
+
+    def wait(self):
+        """
+        Wait for every transfer to finish
+
+        :return: list of the object names whose upload failed
+        """
+        failed = []
+        for object_name, future in self.uploads:
+            try:
+                if not future.result():
+                    failed.append(object_name)
+            except Exception:
+                logging.exception("==> Uploading %s failed", object_name)
+                failed.append(object_name)
+        self.executor.shutdown()
+        return failed
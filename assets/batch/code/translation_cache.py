@@ -0,0 +1,155 @@
+"""
+Content-addressed cache of Amazon Translate results
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage import open_store
+
+
+class TranslationCache:
+    """
+    Two-level cache of translations keyed on hash(text, source, target): an
+    in-process LRU in front of an optional persistent store (LocalStore in
+    tests, S3Store in production). Entries older than ttl seconds are
+    treated as misses and dropped. The LRU and the counters are guarded by a
+    lock, the store is read and written outside of it.
+    """
+
+    def __init__(self, store=None, ttl=None, max_entries=1024):
+        """
+        :param store: optional persistent store (see storage.open_store)
+        :param ttl: optional time to live of the entries, in seconds
+        :param max_entries: maximum number of translations kept in memory
+        """
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(text, source_lang_code, target_lang_code):
+        """
+        Return the content address of a translation request
+
+        :param text: the text to translate
+        :param source_lang_code: the language code of the text
+        :param target_lang_code: the language code to translate to
+        """
+        digest = hashlib.sha256()
+        for part in (source_lang_code, target_lang_code, text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, text, source_lang_code, target_lang_code):
+        """
+        Return the cached translation of text, or None on a miss
+
+        :param text: the text to translate
+        :param source_lang_code: the language code of the text
+        :param target_lang_code: the language code to translate to
+        """
+        key = self.key(text, source_lang_code, target_lang_code)
+        expired = False
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry['text']
+                del self._entries[key]
+                expired = True
+
+        if self.store is not None:
+            data = self.store.get(key + ".json")
+            if data is not None:
+                entry = json.loads(data)
+                if self._is_fresh(entry):
+                    with self._lock:
+                        self._remember(key, entry)
+                        self.store_hits += 1
+                    return entry['text']
+                self.store.delete(key + ".json")
+                expired = True
+
+        with self._lock:
+            if expired:
+                self.expired += 1
+            self.misses += 1
+        return None
+
+    def put(self, text, source_lang_code, target_lang_code, translated_text):
+        """
+        Cache the translation of text
+
+        :param text: the text that was translated
+        :param source_lang_code: the language code of the text
+        :param target_lang_code: the language code it was translated to
+        :param translated_text: the translation
+        """
+        key = self.key(text, source_lang_code, target_lang_code)
+        entry = {'created': time.time(), 'text': translated_text}
+        with self._lock:
+            self._remember(key, entry)
+        if self.store is not None:
+            self.store.put(key + ".json", json.dumps(entry).encode('utf-8'))
+
+    def clear(self):
+        """
+        Forget the translations kept in memory, the store keeps its entries
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return the hit/miss counters of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits, 'store_hits': self.store_hits,
+                    'misses': self.misses, 'expired': self.expired,
+                    'entries': len(self._entries)}
+
+    def log_stats(self):
+        """
+        Log the hit/miss counters of the cache
+        """
+        logging.info("\t==> Translation cache: %(hits)d hits, %(store_hits)d store hits, "
+                     "%(misses)d misses, %(expired)d expired" % self.stats())
+
+    def _is_fresh(self, entry):
+        return self.ttl is None or time.time() - entry['created'] < self.ttl
+
+    def _remember(self, key, entry):
+        # called with the lock held
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def translation_cache_from_env():
+    """
+    Build the TranslationCache configured by TRANSLATION_CACHE (s3://bucket/prefix
+    or local directory) and TRANSLATION_CACHE_TTL (seconds)
+    """
+    location = os.getenv('TRANSLATION_CACHE')
+    ttl = os.getenv('TRANSLATION_CACHE_TTL')
+    return TranslationCache(open_store(location) if location else None,
+                            ttl=float(ttl) if ttl else None)
+
+
+TRANSLATION_CACHE = translation_cache_from_env()
@@ -0,0 +1,85 @@
+"""
+Amazon Translate for texts of any length: sentence-aligned chunks under the
+request limit, translated concurrently and cached one by one
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import get_client
+from chunking import chunk_text
+from translation_cache import TRANSLATION_CACHE
+
+# Maximum size in UTF-8 bytes Amazon Translate accepts in one translate_text request
+TRANSLATE_MAX_BYTES = 10000
+
+# Languages written without spaces between sentences
+NO_SPACE_LANGUAGES = ('ja', 'zh', 'zh-TW')
+
+
+def get_translate_concurrency():
+    """
+    Return TRANSLATE_CONCURRENCY, the maximum number of translate_text
+    requests in flight for one text
+    """
+    return int(os.getenv('TRANSLATE_CONCURRENCY', '4'))
+
+
+def utf8_length(text):
+    return len(text.encode('utf-8'))
+
+
+def translate_chunk(chunk, source_lang_code, target_lang_code, region):
+    """
+    Translate one chunk through TRANSLATION_CACHE
+
+    :param chunk: the text to translate, under TRANSLATE_MAX_BYTES
+    :param source_lang_code: the language code of the text
+    :param target_lang_code: the language code to translate to
+    :param region: the aws region in which to run the service
+    """
+    translated = TRANSLATION_CACHE.get(chunk, source_lang_code, target_lang_code)
+    if translated is not None:
+        return translated
+
+    translated = get_client('translate', region).translate_text(
+        Text=chunk, SourceLanguageCode=source_lang_code,
+        TargetLanguageCode=target_lang_code)["TranslatedText"]
+
+    TRANSLATION_CACHE.put(chunk, source_lang_code, target_lang_code, translated)
+    return translated
+
+
+def translate_chunked(text, source_lang_code, target_lang_code, region):
+    """
+    Translate text in sentence-aligned chunks, at most TRANSLATE_CONCURRENCY
+    at a time, and reassemble the translations in order. The chunk threads
+    share TRANSLATION_CACHE with every other caller, which locks its LRU.
+
+    :param text: the text to translate
+    :param source_lang_code: the language code of the text
+    :param target_lang_code: the language code to translate to
+    :param region: the aws region in which to run the service
+    :return: (translated text, chunks) where chunks lists the
+             (source start, source end, target start, target end) character
+             offsets of every chunk in the text and in its translation
+    """
+    spans = chunk_text(text, TRANSLATE_MAX_BYTES, utf8_length)
+    logging.info("\t==> Translating %s -> %s in %d chunks" %
+                 (source_lang_code, target_lang_code, len(spans)))
+
+    with ThreadPoolExecutor(max_workers=get_translate_concurrency()) as executor:
+        translations = list(executor.map(
+            lambda span: translate_chunk(text[span[0]:span[1]], source_lang_code,
+                                         target_lang_code, region), spans))
+
+    separator = "" if target_lang_code in NO_SPACE_LANGUAGES else " "
+    chunks = []
+    position = 0
+    for (start, end), translation in zip(spans, translations):
+        if chunks:
+            position += len(separator)
+        chunks.append((start, end, position, position + len(translation)))
+        position += len(translation)
+
+    return separator.join(translations), chunks
@@ -0,0 +1,329 @@
+"""
+Long-lived worker running many jobs in one container: the interpreter,
+MoviePy, NumPy, boto3, the AWS clients and the subtitle and translation
+caches stay warm from one job to the next.
+
+A job descriptor is a JSON object of the environment variables a single run
+of locate.py reads, e.g.
+{"INVIDEO": "s3://...", "INSUBTITLES": "s3://...", "OUTBUCKET": "...",
+ "OUTLANG": "es de", "REGION": "eu-central-1"}
+
+Jobs come from WORKER_QUEUE: an Amazon SQS queue URL, or a local spool
+directory of *.json descriptor files.
+"""
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+import locate
+from aws_clients import get_client
+from metrics import METRICS
+from pcm import PCM_TRACKS
+from processes import descendants
+
+# Time and memory, including ffmpeg and worker processes, a job may use (0: no limit)
+JOB_SECONDS = float(os.getenv('WORKER_JOB_SECONDS', '3600'))
+JOB_MEMORY_MB = float(os.getenv('WORKER_JOB_MEMORY_MB', '0'))
+
+# Number of jobs after which the worker exits (0: no limit)
+MAX_JOBS = int(os.getenv('WORKER_MAX_JOBS', '0'))
+
+# Seconds without a job after which the worker exits (0: wait forever)
+IDLE_SECONDS = float(os.getenv('WORKER_IDLE_SECONDS', '300'))
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Settings of the state the jobs of a worker share, read once when it starts:
+# the caches, the AWS client pools and the rate limits. A job cannot change them.
+WORKER_SETTINGS = ('TEXT_CACHE_SIZE', 'TEXT_CACHE_DIR', 'TRANSLATION_CACHE',
+                   'TRANSLATION_CACHE_TTL', 'POLLY_TPS', 'TRANSLATE_TPS',
+                   'AWS_MAX_POOL_CONNECTIONS', 'AWS_MAX_ATTEMPTS', 'WORKER_QUEUE',
+                   'WORKER_JOB_SECONDS', 'WORKER_JOB_MEMORY_MB', 'WORKER_MAX_JOBS',
+                   'WORKER_IDLE_SECONDS')
+
+# Local locations a job opens per job, resolved against the directory of the
+# worker before the job changes to its own temporary one
+LOCATION_SETTINGS = ('CHECKPOINT_URI', 'SHARED_URI')
+
+
+class JobOverBudget(BaseException):
+    """
+    Raised in the main thread when a job runs out of time or memory. Not an
+    Exception, so the per-language error handling of locate does not catch it.
+    """
+
+
+def process_tree_rss():
+    """
+    Return the resident memory in bytes of this process and all its
+    descendants, or of this process only where /proc does not list children
+    """
+    total = 0
+    for pid in [os.getpid()] + descendants(os.getpid()):
+        try:
+            with open('/proc/%d/statm' % pid) as file:
+                total += int(file.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class Budget:
+    """
+    Context manager raising JobOverBudget in the main thread once the block
+    runs longer than seconds, or once the process tree uses more than
+    memory_mb. A subprocess.run interrupted this way kills its process, and
+    the process pools of locate (processes.process_pool) kill their workers
+    and the ffmpeg processes they started.
+    """
+
+    def __init__(self, seconds=0, memory_mb=0, interval=1.0):
+        """
+        :param seconds: wall time allowed, 0 for no limit
+        :param memory_mb: resident memory allowed in MiB, 0 for no limit
+        :param interval: seconds between two memory samples
+        """
+        self.seconds = seconds
+        self.memory_mb = memory_mb
+        self.interval = interval
+        self.reason = None
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.reason = None
+        self._stop.clear()
+        self._previous = signal.signal(signal.SIGALRM, self._interrupt)
+        if self.seconds:
+            signal.setitimer(signal.ITIMER_REAL, self.seconds)
+        if self.memory_mb:
+            self._watchdog = threading.Thread(target=self._watch, daemon=True)
+            self._watchdog.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        self._stop.set()
+        if self.memory_mb:
+            self._watchdog.join()
+        signal.signal(signal.SIGALRM, self._previous)
+        return False
+
+    def _interrupt(self, signum, frame):
+        if self._stop.is_set():
+            return
+        raise JobOverBudget(self.reason or "ran for more than %g seconds" % self.seconds)
+
+    def _watch(self):
+        main_thread = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            rss_mb = process_tree_rss() / 1024 / 1024
+            if rss_mb > self.memory_mb:
+                self.reason = "used %.0f MiB, more than %g MiB" % (rss_mb, self.memory_mb)
+                signal.pthread_kill(main_thread, signal.SIGALRM)
+                return
+
+
+class SpoolQueue:
+    """
+    Jobs read from the *.json files of a local directory, oldest name first.
+    A job is claimed by renaming its file, so several workers can share the
+    directory, then moved to done/ or failed/.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: the spool directory
+        """
+        self.directory = directory
+        for name in ("done", "failed"):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    def receive(self, wait_seconds):
+        """
+        Claim the next job, waiting up to wait_seconds for one
+
+        :return: (job id, descriptor) or None
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".json"):
+                    continue
+                claimed = os.path.join(self.directory, name + ".running")
+                try:
+                    os.rename(os.path.join(self.directory, name), claimed)
+                except FileNotFoundError:
+                    # another worker claimed it first
+                    continue
+                try:
+                    with open(claimed) as file:
+                        return claimed, json.load(file)
+                except ValueError:
+                    logging.exception("==> Invalid job descriptor: %s", name)
+                    self.finish(claimed, False)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(1)
+
+    def finish(self, job_id, succeeded):
+        """
+        Move a claimed job to done/ or failed/
+        """
+        name = os.path.basename(job_id)[:-len(".running")]
+        os.rename(job_id, os.path.join(self.directory, "done" if succeeded else "failed", name))
+
+
+class SqsQueue:
+    """
+    Jobs received from an Amazon SQS queue. A job that fails is not deleted,
+    it comes back once its visibility timeout expires and goes to the
+    dead-letter queue of the redrive policy after too many attempts.
+    """
+
+    def __init__(self, queue_url, region=None):
+        """
+        :param queue_url: the URL of the queue
+        :param region: the aws region of the queue
+        """
+        self.queue_url = queue_url
+        self.client = get_client('sqs', region)
+
+    def receive(self, wait_seconds):
+        """
+        Receive the next job, long polling up to wait_seconds for one
+
+        :return: (receipt handle, descriptor) or None
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            wait = int(max(0, min(20, deadline - time.monotonic())))
+            params = {}
+            if JOB_SECONDS:
+                # keep the message hidden from other workers while the job may run
+                params['VisibilityTimeout'] = int(JOB_SECONDS) + 60
+            messages = self.client.receive_message(
+                QueueUrl=self.queue_url, MaxNumberOfMessages=1, WaitTimeSeconds=wait,
+                **params).get('Messages', [])
+            for message in messages:
+                try:
+                    return message['ReceiptHandle'], json.loads(message['Body'])
+                except ValueError:
+                    logging.exception("==> Invalid job descriptor: %s", message['Body'])
+                    self.finish(message['ReceiptHandle'], True)
+            if time.monotonic() >= deadline:
+                return None
+
+    def finish(self, job_id, succeeded):
+        """
+        Delete the message of a job that succeeded
+        """
+        if succeeded:
+            self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=job_id)
+
+
+def open_queue(name):
+    """
+    Return the SqsQueue for an https:// queue URL, the SpoolQueue of a directory otherwise
+
+    :param name: the queue URL or spool directory
+    """
+    if name.startswith("https://"):
+        # https://sqs.<region>.amazonaws.com/<account>/<queue>
+        return SqsQueue(name, name.split("/")[2].split(".")[1])
+    return SpoolQueue(name)
+
+
+def run_descriptor(descriptor, budget):
+    """
+    Run locate.run_job in a fresh working directory, with the environment
+    variables of the descriptor set for the duration of the job and the
+    LOCATION_SETTINGS made absolute. A descriptor that changes one of the
+    WORKER_SETTINGS is rejected with a ValueError.
+
+    :param descriptor: dict of environment variable names and values
+    :param budget: the Budget the job runs in
+    :return: True if the job succeeded
+    """
+    fixed = sorted(name for name in descriptor if name in WORKER_SETTINGS and
+                   str(descriptor[name]) != os.environ.get(name))
+    if fixed:
+        raise ValueError("%s cannot change from one job to the next, "
+                         "set them on the worker instead" % ", ".join(fixed))
+
+    saved = {name: os.environ.get(name) for name in set(descriptor) | set(LOCATION_SETTINGS)}
+    os.environ.update({name: str(value) for name, value in descriptor.items()})
+    for name in LOCATION_SETTINGS:
+        location = os.environ.get(name)
+        if location and not location.startswith('s3://'):
+            os.environ[name] = os.path.abspath(location)
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="job-", dir=cwd)
+    os.chdir(work_dir)
+    try:
+        with budget:
+            return locate.run_job()
+    except SystemExit as error:
+        return not error.code
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        PCM_TRACKS.clear()
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def main():
+    """
+    Run the jobs of WORKER_QUEUE until it stays empty for IDLE_SECONDS, MAX_JOBS
+    jobs ran, or a job goes over its budget. The worker then exits so that a
+    job that overran, and whatever it left behind, does not affect the next one.
+    """
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    queue = open_queue(os.environ['WORKER_QUEUE'])
+    budget = Budget(JOB_SECONDS, JOB_MEMORY_MB)
+    jobs = 0
+
+    while not MAX_JOBS or jobs < MAX_JOBS:
+        job = queue.receive(IDLE_SECONDS or float('inf'))
+        if job is None:
+            logging.info("==> No job for %g seconds, stopping", IDLE_SECONDS)
+            break
+        job_id, descriptor = job
+        jobs += 1
+        logging.info("==> Job %d: %s", jobs, descriptor.get('INVIDEO'))
+        started = time.perf_counter()
+
+        try:
+            succeeded = run_descriptor(descriptor, budget)
+        except JobOverBudget as error:
+            logging.error("==> Job %s %s, stopping the worker", job_id, error)
+            queue.finish(job_id, False)
+            sys.exit(2)
+        except Exception:
+            logging.exception("==> Job %s failed", job_id)
+            succeeded = False
+        finally:
+            # the records of the job were emitted by run_job
+            METRICS.take()
+
+        queue.finish(job_id, succeeded)
+        logging.info("==> Job %d %s in %.1f s, %.0f MiB resident", jobs,
+                     "succeeded" if succeeded else "failed",
+                     time.perf_counter() - started, process_tree_rss() / 1024 / 1024)
+
+        if JOB_MEMORY_MB and process_tree_rss() / 1024 / 1024 > JOB_MEMORY_MB:
+            logging.warning("==> Memory still over budget after the job, stopping the worker")
+            break
+
+
+if __name__ == "__main__":
+    main()
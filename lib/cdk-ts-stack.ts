@@ -54,8 +54,13 @@ export class CdkTsStack extends cdk.Stack {
       bucketName: cdk.Stack.of(this).account + "-transcribed-after-review", ...defaultBucketProps
     });
     const videoOutputS3bucket = new s3.Bucket(this, 'VideoOutputS3bucket', {
-      bucketName: cdk.Stack.of(this).account + "-final-videos", ...defaultBucketProps
+      bucketName: cdk.Stack.of(this).account + "-final-videos", ...defaultBucketProps,
+      // intermediates shared by the language jobs of one video
+      lifecycleRules: [{ prefix: 'intermediates/', expiration: cdk.Duration.days(7) }],
     });
+    const sharedURI = "s3://" + videoOutputS3bucket.bucketName + "/intermediates";
+    // one Batch array child per language
+    const outputLanguages = "es de";
 
     const transcribeTriggerRole = new iam.Role(this, "TranscribeTriggerRole", {
       roleName: "TranscribeTriggerRole",
@@ -308,6 +313,16 @@ export class CdkTsStack extends cdk.Stack {
               videoOutputS3bucket.bucketArn,
               videoOutputS3bucket.bucketArn + '/*',
             ],
+          }), new iam.PolicyStatement({
+            effect: iam.Effect.ALLOW,
+            actions: [
+              "s3:GetObject",
+              "s3:ListBucket",
+            ],
+            resources: [
+              videoOutputS3bucket.bucketArn,
+              videoOutputS3bucket.bucketArn + '/intermediates/*',
+            ],
           }), new iam.PolicyStatement({
             effect: iam.Effect.ALLOW,
             actions: [
@@ -350,7 +365,7 @@ export class CdkTsStack extends cdk.Stack {
           "INVIDEO": "s3://initial-videos/video.mp4",
           "INSUBTITLES": "s3://transcribed-to-review/transcribe_cfadc0531765c2f6_video.mp4.json",
           "OUTBUCKET": "transcribed-to-review",
-          "OUTLANG": "es de",
+          "OUTLANG": outputLanguages,
           "REGION": "eu-central-1"
         },
         jobRole: inContainerBatchRole,
@@ -389,6 +404,8 @@ export class CdkTsStack extends cdk.Stack {
         "JOB_QUEUE_NAME": jobQueue.jobQueueName,
         "OUTPUT_BUCKET_NAME": videoOutputS3bucket.bucketName,
         "VIDEO_BUCKET_NAME": rowVideoS3bucket.bucketName,
+        "OUTLANG": outputLanguages,
+        "SHARED_URI": sharedURI,
       }
     });
 